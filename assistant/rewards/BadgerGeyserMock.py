@@ -3,6 +3,7 @@ from dotmap import DotMap
 from rich.console import Console
 from tabulate import tabulate
 from config.badger_config import badger_config
+from assistant.rewards.geyser_state import UserGeyserState, UserStake
 
 console = Console()
 
@@ -61,7 +62,7 @@ class BadgerGeyserMock:
         self.events = DotMap()
         self.stakes = DotMap()
         self.totalShareSeconds = 0
-        self.users = DotMap()
+        self.users = {}
         self.unlockSchedules = DotMap()
         self.distributionTokens = []
         self.totalDistributions = DotMap()
@@ -83,6 +84,57 @@ class BadgerGeyserMock:
         """
         return False
 
+    def get_state(self):
+        """
+        Plain data snapshot of the stakes and share seconds of every user
+        Range-specific values are left out, they are recomputed for each period
+        """
+        users = []
+        for user, data in self.users.items():
+            entry = {
+                "stakes": [
+                    {"amount": stake.amount, "stakedAt": stake.stakedAt}
+                    for stake in data.stakes
+                ],
+                "total": data.total,
+                "lastUpdate": data.lastUpdate,
+                "shareSeconds": data.shareSeconds,
+            }
+            users.append([user, entry])
+
+        return {"totalShareSeconds": self.totalShareSeconds, "users": users}
+
+    def load_state(self, state):
+        """
+        Restore stakes and share seconds from get_state(), preserving the original user order
+        """
+        self.totalShareSeconds = state["totalShareSeconds"]
+        for user, entry in state["users"]:
+            data = UserGeyserState()
+            data.stakes = [
+                UserStake(stake["amount"], stake["stakedAt"])
+                for stake in entry["stakes"]
+            ]
+            data.stakedAmount = sum(stake.amount for stake in data.stakes)
+            data.total = entry["total"]
+            data.lastUpdate = entry["lastUpdate"]
+            data.shareSeconds = entry.get("shareSeconds", 0)
+            self.users[user] = data
+
+    def load_share_seconds(self, users, shareSeconds, shareSecondsInRange):
+        """
+        Set end of period share seconds computed elsewhere (e.g. by the columnar engine), without stake details
+        """
+        for user, userShareSeconds, userShareSecondsInRange in zip(
+            users, shareSeconds, shareSecondsInRange
+        ):
+            data = self.get_user(user)
+            data.shareSeconds = userShareSeconds
+            data.shareSecondsInRange = userShareSecondsInRange
+            data.lastUpdate = self.endTime
+        self.totalShareSeconds = sum(shareSeconds)
+        self.totalShareSecondsInRange = sum(shareSecondsInRange)
+
     def add_distribution_token(self, token):
         self.distributionTokens.append(token)
 
@@ -180,17 +232,12 @@ class BadgerGeyserMock:
             userMetadata[user] = {}
             for token, tokenAmount in tokenDistributions.items():
                 # Record total share seconds
-                if not "shareSeconds" in userData:
-                    userMetadata[user]["shareSeconds"] = 0
-                else:
-                    userMetadata[user]["shareSeconds"] = userData.shareSeconds
+                userMetadata[user]["shareSeconds"] = userData.shareSeconds
 
                 # Track Distribution based on seconds in range
-                if "shareSecondsInRange" in userData:
-                    userMetadata[user][
-                        "shareSecondsInRange"
-                    ] = userData.shareSecondsInRange
-                    totalShareSecondsUsed += userData.shareSecondsInRange
+                userMetadata[user]["shareSecondsInRange"] = userData.shareSecondsInRange
+                totalShareSecondsUsed += userData.shareSecondsInRange
+                if userData.shareSecondsInRange > 0:
                     userShare = int(
                         tokenAmount
                         * userData.shareSecondsInRange
@@ -200,7 +247,6 @@ class BadgerGeyserMock:
 
                 else:
                     userDistributions[user][token] = 0
-                    userMetadata[user]["shareSecondsInRange"] = 0
 
         assert totalShareSecondsUsed == self.totalShareSecondsInRange
         tokenTotals = self.get_token_totals_from_user_dists(userDistributions)
@@ -230,23 +276,25 @@ class BadgerGeyserMock:
         self.process_share_seconds(user, unstake.timestamp)
 
         # Process unstakes from individual stakes
+        data = self.get_user(user)
         toUnstake = int(unstake.amount)
+        data.stakedAmount -= toUnstake
         while toUnstake > 0:
-            stake = self.users[user].stakes[-1]
+            stake = data.stakes[-1]
 
             # This stake won't cover, remove
-            if toUnstake >= stake["amount"]:
-                self.users[user].stakes.pop()
-                toUnstake -= stake["amount"]
+            if toUnstake >= stake.amount:
+                data.stakes.pop()
+                toUnstake -= stake.amount
 
             # This stake will cover the unstaked amount, reduce
             else:
-                self.users[user].stakes[-1]["amount"] -= toUnstake
+                stake.amount -= toUnstake
                 toUnstake = 0
 
         # Update globals
-        self.users[user].total = unstake.userTotal
-        self.users[user].lastUpdate = unstake.timestamp
+        data.total = unstake.userTotal
+        data.lastUpdate = unstake.timestamp
 
         # console.log("unstake", self.users[user].toDict(), unstake, self.users[user])
 
@@ -258,19 +306,19 @@ class BadgerGeyserMock:
         self.addStake(user, stake)
 
         # Update Globals
-        self.users[user].lastUpdate = stake.timestamp
-        self.users[user].total = stake.userTotal
+        data = self.users[user]
+        data.lastUpdate = stake.timestamp
+        data.total = stake.userTotal
 
     def addStake(self, user, stake):
-        if not self.users[user].stakes:
-            self.users[user].stakes = []
-        self.users[user].stakes.append(
-            {"amount": stake.amount, "stakedAt": stake.stakedAt}
-        )
+        data = self.get_user(user)
+        data.stakes.append(UserStake(stake.amount, stake.stakedAt))
+        data.stakedAmount += stake.amount
 
     def calc_end_share_seconds_for(self, user):
         self.process_share_seconds(user, self.endTime)
-        self.users[user].lastUpdate = self.endTime
+        if user in self.users:
+            self.users[user].lastUpdate = self.endTime
 
     def calc_end_share_seconds(self):
         """
@@ -288,10 +336,10 @@ class BadgerGeyserMock:
         return int(timestamp - lastUpdate)
 
     def process_share_seconds(self, user, timestamp):
-        data = self.users[user]
+        data = self.users.get(user)
 
         # Return 0 if user has no tokens
-        if not "total" in data:
+        if not data or data.total is None:
             return 0
 
         lastUpdate = self.getLastUpdate(user)
@@ -305,44 +353,41 @@ class BadgerGeyserMock:
         if timeSinceLastAction == 0:
             return 0
 
-        toAdd = 0
+        # The weighting doesn't depend on the individual stake, so the running total of all stakes can be weighted at once
+        stakedAmount = data.stakedAmount
+        toAdd = stakedAmount * self.calculate_weighted_seconds(
+            None, timeSinceLastAction, timestamp
+        )
         toAddInRange = 0
-
-        for stake in data.stakes:
-            toAdd += stake["amount"] * self.calculate_weighted_seconds(
-                stake, timeSinceLastAction, timestamp
+        if timestamp > self.startTime:
+            toAddInRange = stakedAmount * self.calculate_weighted_seconds(
+                None, timeSinceLastActionRangeGated, timestamp
             )
-            if timestamp > self.startTime:
-                toAddInRange += stake["amount"] * self.calculate_weighted_seconds(
-                    stake, timeSinceLastActionRangeGated, timestamp
-                )
         assert toAdd >= 0
 
-        # If user has share seconds, add
-        if "shareSeconds" in data:
-            data.shareSeconds += toAdd
-            self.totalShareSeconds += toAdd
+        data.shareSeconds += toAdd
+        self.totalShareSeconds += toAdd
 
-        # If user has no share seconds, set
-        else:
-            data.shareSeconds = toAdd
-            self.totalShareSeconds += toAdd
-
-        if "shareSecondsInRange" in data:
-            data.shareSecondsInRange += toAddInRange
-        else:
-            data.shareSecondsInRange = toAddInRange
+        data.shareSecondsInRange += toAddInRange
         self.totalShareSecondsInRange += toAddInRange
 
-        self.users[user] = data
-
     # ===== Getters =====
 
+    def get_user(self, user):
+        """
+        Get the state for a user, creating it on their first action
+        """
+        data = self.users.get(user)
+        if not data:
+            data = UserGeyserState()
+            self.users[user] = data
+        return data
+
     def getLastUpdate(self, user):
         """
         Get the last time the specified user took an action
         """
-        if not self.users[user].lastUpdate:
+        if user not in self.users:
             return 0
         return self.users[user].lastUpdate
 
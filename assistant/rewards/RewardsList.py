@@ -1,3 +1,9 @@
+from assistant.rewards.claim_encoder import ClaimEncoderCheck, encode_claim
+from assistant.rewards.rewards_ledger import (
+    LedgerClaims,
+    RewardsLedger,
+    extend_indices,
+)
 from brownie import *
 from dotmap import DotMap
 from rich.console import Console
@@ -9,24 +15,39 @@ console = Console()
 
 class RewardsList:
     def __init__(self, cycle, badgerTree) -> None:
-        self.claims = DotMap()
+        self.ledger = RewardsLedger()
+        self.claims = LedgerClaims(self.ledger)
         self.tokens = DotMap()
-        self.totals = DotMap()
         self.cycle = cycle
         self.badgerTree = badgerTree
         self.metadata = DotMap()
-        self.sources = DotMap()
-        self.sourceMetadata = DotMap()
+        # Set by the merge with the previous tree: claim index and first cumulative amount of each previous user
+        self.previousIndices = None
+        self.previousAmounts = None
+        # Per source (geyser key) columns of this cycle's rewards, and each source's share seconds by user
+        self.sources = {}
+        self.sourceMetadata = {}
 
     def increase_user_rewards_source(self, source, user, token, toAdd):
-        if not self.sources[source][user][token]:
-            self.sources[source][user][token] = 0
-        self.sources[source][user][token] += toAdd
+        if toAdd < 0:
+            toAdd = 0
+        if source not in self.sources:
+            self.sources[source] = RewardsLedger()
+        self.sources[source].add_amount(user, token, toAdd)
 
     def track_user_metadata_source(self, source, user, metadata):
-        if not self.sourceMetadata[source][user][metadata]:
-            self.sourceMetadata[source][user][metadata] = DotMap()
-        self.sourceMetadata[source][user][metadata] = metadata
+        self.sourceMetadata.setdefault(source, {})[user] = metadata[user]
+
+    def add_source_claims(self, source, claims, metadata=None):
+        """
+        Add {user: {token: amount}} from one source to the totals and to the source's own columns
+        """
+        for user, userClaims in claims.items():
+            if metadata and user in metadata:
+                self.track_user_metadata_source(source, user, metadata)
+            for token, amount in userClaims.items():
+                self.increase_user_rewards(user, token, amount)
+                self.increase_user_rewards_source(source, user, token, amount)
 
     def increase_user_rewards(self, user, token, toAdd):
         if toAdd < 0:
@@ -36,15 +57,32 @@ class RewardsList:
         """
         If user has rewards, increase. If not, set their rewards to this initial value
         """
-        if user in self.claims and token in self.claims[user]:
-            self.claims[user][token] += toAdd
-        else:
-            self.claims[user][token] = toAdd
+        self.ledger.add_amount(user, token, toAdd)
 
-        if token in self.totals:
-            self.totals[token] += toAdd
-        else:
-            self.totals[token] = toAdd
+    def add_claims(self, claims):
+        """
+        Add {user: {token: amount}}
+        """
+        for user, userClaims in claims.items():
+            for token, amount in userClaims.items():
+                self.increase_user_rewards(user, token, amount)
+
+    def load_ledger(self, ledger):
+        """
+        Replace the claims with a ledger built elsewhere
+        """
+        self.ledger = ledger
+        self.claims = LedgerClaims(ledger)
+
+    def add_rewards(self, other):
+        """
+        Add another RewardsList's claims in one merge of their ledgers
+        """
+        self.ledger.add(other.ledger)
+
+    @property
+    def totals(self):
+        return DotMap(self.ledger.token_totals())
 
     def track_user_metadata(self, user, metadata):
         if user in self.metadata:
@@ -74,7 +112,7 @@ class RewardsList:
             table.append(
                 [
                     user,
-                    data["0x3472A5A71965499acd81997a54BBA8D852C6E53d"],
+                    data.get("0x3472A5A71965499acd81997a54BBA8D852C6E53d", 0),
                     shareSeconds,
                     shareSecondsInRange,
                 ]
@@ -93,81 +131,72 @@ class RewardsList:
             return False
 
     def getTokenRewards(self, user, token):
-        if self.claims[user][token]:
-            return self.claims[user][token]
-        else:
-            return 0
+        return self.ledger.get(user, token)
 
-    def to_node_entry(self, user, userData, cycle, index):
+    def to_node_entry(self, user, tokens, amounts, cycle, index):
+        """
+        Returns (nodeEntry, encoded)
+        """
         nodeEntry = {
             "user": user,
-            "tokens": [],
-            "cumulativeAmounts": [],
+            "tokens": tokens,
+            "cumulativeAmounts": [str(amount) for amount in amounts],
             "cycle": cycle,
             "index": index,
         }
-        for tokenAddress, cumulativeAmount in userData.items():
-            nodeEntry["tokens"].append(tokenAddress)
-            nodeEntry["cumulativeAmounts"].append(str(cumulativeAmount))
-
-        # encoded = encode_hex(
-        #     encode_abi_packed(
-        #         ["uint", "address", "uint", "address[]", "uint[]"],
-        #         (
-        #             nodeEntry["index"],
-        #             nodeEntry["user"],
-        #             nodeEntry["cycle"],
-        #             nodeEntry["tokens"],
-        #             nodeEntry["cumulativeAmounts"],
-        #         ),
-        #     )
-        # )
-
-        encoder = ClaimEncoder.at("0x19be80e976cb397ae584d350153914ced7c1b1d2")
-
-        claim = encoder.encodeClaim(
-            nodeEntry["tokens"],
-            nodeEntry["cumulativeAmounts"],
-            nodeEntry["index"],
-            nodeEntry["cycle"],
-            nodeEntry["user"],
-        )[0]
-
-        local = encoder.encodeClaim.encode_input(
-            nodeEntry["tokens"],
-            nodeEntry["cumulativeAmounts"],
-            nodeEntry["index"],
-            nodeEntry["cycle"],
-            nodeEntry["user"],
+        encoded = encode_hex(
+            encode_claim(
+                nodeEntry["tokens"],
+                nodeEntry["cumulativeAmounts"],
+                nodeEntry["index"],
+                nodeEntry["cycle"],
+                nodeEntry["user"],
+            )
         )
-
-        console.log("claimcheck", claim, local)
-
-        encoded = encode_hex(claim)
-
-        # console.log("nodeEntry", nodeEntry)
-        # console.log("encoded", encoded)
         return (nodeEntry, encoded)
 
-    def to_merkle_format(self):
+    def assign_indices(self, previousClaims):
+        """
+        Users keep their index from the previous tree, new users are appended in claims order
+        Uses the indices recorded by the merge with the previous tree when there are some, without reading it again
         """
-        - Sort users into alphabetical order
+        previousIndices = self.previousIndices
+        if previousIndices is None:
+            previousIndices = {
+                user: int(claim["index"], 16) for user, claim in previousClaims.items()
+            }
+        return (extend_indices(self.claims, previousIndices), previousIndices)
+
+    def to_merkle_format(self, previousTree=None):
+        """
+        - Users keep their index from previousTree, entries are in index order
         - Node entry = [cycle, user, index, token[], cumulativeAmount[]]
+        - Every leaf changes each cycle, as the cycle is part of the claim, so every claim is encoded and hashed
         """
         cycle = self.cycle
-        dict = self.claims.toDict()
+        previousClaims = previousTree["claims"] if previousTree else {}
 
         nodeEntries = []
         encodedEntries = []
         entries = []
 
-        index = 0
+        (indices, previousIndices) = self.assign_indices(previousClaims)
+        encoderCheck = ClaimEncoderCheck()
 
-        for user, userData in self.claims.items():
-            (nodeEntry, encoded) = self.to_node_entry(user, userData, cycle, index)
+        for user, tokens, amounts in self.ledger.iter_users(key=indices.get):
+            (nodeEntry, encoded) = self.to_node_entry(
+                user, tokens, amounts, cycle, indices[user]
+            )
+            encoderCheck.maybe_check(nodeEntry, encoded)
             nodeEntries.append(nodeEntry)
             encodedEntries.append(encoded)
             entries.append({"node": nodeEntry, "encoded": encoded})
-            index += 1
 
+        console.log(
+            {
+                "leaves": len(nodeEntries),
+                "newUsers": sum(1 for user in indices if user not in previousIndices),
+                "checkedAgainstClaimEncoder": encoderCheck.checked,
+            }
+        )
         return (nodeEntries, encodedEntries, entries)
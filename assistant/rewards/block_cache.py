@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+
+from assistant.rewards.config import rewards_config
+from brownie import chain, web3
+from eth_utils import encode_hex
+from web3 import HTTPProvider
+
+# Private web3 helper, make_post_request(endpoint_uri, data, **kwargs) in web3 5.x (brownie >= 1.11) and 6.x
+# If it moves, headers are fetched one by one
+try:
+    from web3._utils.request import make_post_request
+except ImportError:
+    make_post_request = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    number INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+"""
+
+
+class BlockCache:
+    """
+    Block header cache shared by everything in the rewards assistant
+    Recent headers are kept in an in-memory LRU, headers of finalized blocks are also persisted to disk
+    Missing headers are fetched in a single JSON-RPC batch
+    """
+
+    def __init__(self, path, maxSize=4096, confirmations=20):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.headers = OrderedDict()
+        self.maxSize = maxSize
+        self.confirmations = confirmations
+
+    def get_timestamp(self, blockNumber):
+        return self.get_block(blockNumber)["timestamp"]
+
+    def get_block(self, blockNumber):
+        return self.get_blocks([blockNumber])[blockNumber]
+
+    def get_blocks(self, blockNumbers):
+        """
+        Get headers ({number, hash, timestamp}) for a list of blocks, returning block number -> header
+        """
+        result = {}
+        missing = []
+        for blockNumber in set(blockNumbers):
+            header = self.headers.get(blockNumber)
+            if header:
+                self.headers.move_to_end(blockNumber)
+                result[blockNumber] = header
+            else:
+                missing.append(blockNumber)
+
+        if missing:
+            stored = self.load_headers(missing)
+            fetched = self.fetch_headers(
+                [blockNumber for blockNumber in missing if blockNumber not in stored]
+            )
+            self.save_headers(fetched.values())
+
+            for blockNumber in missing:
+                header = stored.get(blockNumber) or fetched[blockNumber]
+                self.remember(header)
+                result[blockNumber] = header
+
+        return result
+
+    def remember(self, header):
+        self.headers[header["number"]] = header
+        self.headers.move_to_end(header["number"])
+        while len(self.headers) > self.maxSize:
+            self.headers.popitem(last=False)
+
+    def load_headers(self, blockNumbers):
+        headers = {}
+        for blockNumber in blockNumbers:
+            row = self.db.execute(
+                "SELECT number, hash, timestamp FROM blocks WHERE number = ?",
+                (blockNumber,),
+            ).fetchone()
+            if row:
+                headers[row[0]] = {
+                    "number": row[0],
+                    "hash": row[1],
+                    "timestamp": row[2],
+                }
+        return headers
+
+    def save_headers(self, headers):
+        """
+        Persist headers of finalized blocks only, recent blocks could still be reorged
+        """
+        finalized = chain.height - self.confirmations
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)",
+                [
+                    (header["number"], header["hash"], header["timestamp"])
+                    for header in headers
+                    if header["number"] <= finalized
+                ],
+            )
+
+    def fetch_headers(self, blockNumbers):
+        if not blockNumbers:
+            return {}
+
+        # web3 can't batch, so batches are posted with the HTTP provider's own endpoint, headers and timeout
+        # Other providers fetch one by one
+        # Hashes are 0x prefixed lowercase hex either way, stage cache keys are built from them
+        provider = web3.provider
+        if not isinstance(provider, HTTPProvider) or make_post_request is None:
+            headers = {}
+            for blockNumber in blockNumbers:
+                block = web3.eth.getBlock(blockNumber)
+                headers[blockNumber] = {
+                    "number": blockNumber,
+                    "hash": encode_hex(block["hash"]),
+                    "timestamp": block["timestamp"],
+                }
+            return headers
+
+        batch = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_getBlockByNumber",
+                "params": [hex(blockNumber), False],
+            }
+            for i, blockNumber in enumerate(blockNumbers)
+        ]
+        results = json.loads(
+            make_post_request(
+                provider.endpoint_uri,
+                json.dumps(batch).encode(),
+                **provider.get_request_kwargs()
+            )
+        )
+        if not isinstance(results, list):
+            raise ValueError("Node rejected batch request: {}".format(results))
+
+        headers = {}
+        for entry in results:
+            if "error" in entry or not entry.get("result"):
+                raise ValueError(
+                    "Failed to fetch block {}: {}".format(
+                        blockNumbers[entry.get("id", 0)], entry
+                    )
+                )
+            block = entry["result"]
+            blockNumber = int(block["number"], 16)
+            headers[blockNumber] = {
+                "number": blockNumber,
+                "hash": block["hash"].lower(),
+                "timestamp": int(block["timestamp"], 16),
+            }
+        return headers
+
+
+blockCache = None
+
+
+def get_block_cache():
+    global blockCache
+    if not blockCache:
+        blockCache = BlockCache(
+            rewards_config.blockCachePath,
+            confirmations=rewards_config.eventStoreConfirmations,
+        )
+    return blockCache
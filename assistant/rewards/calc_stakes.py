@@ -1,19 +1,49 @@
 from collections import OrderedDict
 
 from assistant.rewards.BadgerGeyserMock import BadgerGeyserMock
+from assistant.rewards.block_cache import get_block_cache
+from assistant.rewards.columnar_share_seconds import columnar_share_seconds
+from assistant.rewards.config import rewards_config
+from assistant.rewards.event_store import get_event_store
+from assistant.rewards.geyser_state import StakeAction
+from assistant.rewards.geyser_checkpoints import (
+    latest_checkpoint_block,
+    load_checkpoint,
+    save_checkpoint,
+)
 from assistant.subgraph.client import fetch_all_geyser_events
 from brownie import *
-from dotmap import DotMap
+from eth_utils import encode_hex, event_abi_to_log_topic
 from helpers.constants import AddressZero
+from helpers.log_ranges import AdaptiveRangePlanner, scan_logs
 from rich.console import Console
-from tqdm import trange
 
 console = Console()
 
 globalStartBlock = 11381000
+geyserEventNames = ["Staked", "Unstaked"]
 
 
-def calc_geyser_stakes(key, geyser, periodStartBlock, periodEndBlock):
+def calc_geyser_stakes(
+    key, geyser, periodStartBlock, periodEndBlock, events=None, eventsFrom=None
+):
+    """
+    Events for the geyser from eventsFrom to periodEndBlock can be passed in when they were already fetched for several geysers at once
+    They are fetched again if they don't reach back to the checkpoint being resumed from
+    """
+    inputs = prepare_geyser_inputs(
+        key, geyser, periodStartBlock, periodEndBlock, events, eventsFrom
+    )
+    return compute_geyser_rewards(inputs)
+
+
+def prepare_geyser_inputs(
+    key, geyser, periodStartBlock, periodEndBlock, events=None, eventsFrom=None
+):
+    """
+    Gather everything needed to compute rewards for a geyser as plain data
+    All chain and event store access happens here, so the computation itself can run in a worker process
+    """
     console.print(
         " Geyser initial snapshot for " + geyser.address,
         {"from": globalStartBlock, "to": periodEndBlock},
@@ -23,28 +53,151 @@ def calc_geyser_stakes(key, geyser, periodStartBlock, periodEndBlock):
         {"from": periodStartBlock, "to": periodEndBlock},
     )
 
-    globalStartTime = web3.eth.getBlock(globalStartBlock)["timestamp"]
-    periodStartTime = web3.eth.getBlock(periodStartBlock)["timestamp"]
-    periodEndTime = web3.eth.getBlock(periodEndBlock)["timestamp"]
+    blocks = get_block_cache().get_blocks(
+        [globalStartBlock, periodStartBlock, periodEndBlock]
+    )
+
+    # Resume from the latest checkpoint before this period, if there is one
+    checkpoint = None
+    replayFrom = globalStartBlock
+    if use_checkpoints():
+        checkpoint = load_checkpoint(
+            geyser.address,
+            periodStartBlock,
+            lambda fromBlock, toBlock: sync_geyser_events([geyser], fromBlock, toBlock)[
+                geyser.address
+            ],
+        )
+    if checkpoint:
+        replayFrom = checkpoint["block"] + 1
 
-    geyserMock = BadgerGeyserMock(key)
-    geyserMock.set_current_period(periodStartTime, periodEndTime)
+    # Collect events since the checkpoint, or from the start of history
+    if events is None or eventsFrom is None or eventsFrom > replayFrom:
+        events = sync_geyser_events([geyser], replayFrom, periodEndBlock)[
+            geyser.address
+        ]
+    events = [event for event in events if event["blockNumber"] >= replayFrom]
 
-    # Collect actions from the total history
-    console.print("\n[grey]Collect Actions: Entire History[/grey]")
-    actions = collect_actions_from_events(geyser, globalStartBlock, periodEndBlock)
+    return {
+        "key": key,
+        "geyser": geyser.address,
+        "periodStartBlock": periodStartBlock,
+        "periodEndBlock": periodEndBlock,
+        "periodStartTime": blocks[periodStartBlock]["timestamp"],
+        "periodEndTime": blocks[periodEndBlock]["timestamp"],
+        "checkpoint": checkpoint,
+        "replayFrom": replayFrom,
+        # Only events with enough confirmations go into the next checkpoint
+        "checkpointBlock": min(
+            periodEndBlock, chain.height - rewards_config.eventStoreConfirmations
+        ),
+        "events": events,
+        "unlockSchedules": get_unlock_schedules(geyser),
+    }
 
-    # Process actions from the total history
-    console.print("\n[grey]Process Actions: Entire History[/grey]")
-    geyserMock = process_actions(geyserMock, actions, globalStartBlock, periodEndBlock)
+
+def compute_geyser_rewards(inputs):
+    """
+    Replay a geyser's events and split its unlocked tokens between users
+    Only uses the plain data from prepare_geyser_inputs, returns plain data
+    """
+    geyserMock = BadgerGeyserMock(inputs["key"])
+    geyserMock.set_current_period(inputs["periodStartTime"], inputs["periodEndTime"])
+
+    if rewards_config.shareSecondsEngine == "columnar":
+        console.print("\n[grey]Columnar share seconds[/grey]")
+        geyserMock.load_share_seconds(
+            *columnar_share_seconds(
+                inputs["events"], inputs["periodStartTime"], inputs["periodEndTime"]
+            )
+        )
+        return calculate_token_distributions(
+            inputs["unlockSchedules"],
+            geyserMock,
+            inputs["periodStartTime"],
+            inputs["periodEndTime"],
+        )
+
+    checkpoint = inputs["checkpoint"]
+    replayFrom = inputs["replayFrom"]
+    if checkpoint:
+        console.print(
+            " Resuming from checkpoint at block {}".format(checkpoint["block"])
+        )
+        geyserMock.load_state(checkpoint["state"])
+
+    checkpointBlock = inputs["checkpointBlock"]
+    settled = [
+        event for event in inputs["events"] if event["blockNumber"] <= checkpointBlock
+    ]
+    recent = [
+        event for event in inputs["events"] if event["blockNumber"] > checkpointBlock
+    ]
+
+    console.print(
+        "\n[grey]Process Actions: {} to {}[/grey]".format(
+            replayFrom, inputs["periodEndBlock"]
+        )
+    )
+    apply_actions(geyserMock, events_to_actions(settled))
+    if use_checkpoints() and checkpointBlock >= replayFrom:
+        save_checkpoint(
+            inputs["geyser"],
+            checkpointBlock,
+            geyserMock.get_state(),
+            checkpoint,
+            replayFrom,
+            settled,
+        )
+    apply_actions(geyserMock, events_to_actions(recent))
+
+    # End accounting for every user, including those with no actions since the checkpoint
+    for user in geyserMock.users:
+        geyserMock.calc_end_share_seconds_for(user)
 
     return calculate_token_distributions(
-        geyser, geyserMock, periodStartTime, periodEndTime
+        inputs["unlockSchedules"],
+        geyserMock,
+        inputs["periodStartTime"],
+        inputs["periodEndTime"],
+    )
+
+
+def use_checkpoints():
+    """
+    Checkpoints hold BadgerGeyserMock stakes, the columnar engine always works from the full history
+    """
+    return (
+        rewards_config.geyserCheckpoints and rewards_config.shareSecondsEngine == "mock"
     )
 
 
+def get_replay_start(geyser, periodStartBlock):
+    """
+    First block that needs replaying to compute a period for a geyser
+    """
+    if use_checkpoints():
+        block = latest_checkpoint_block(geyser.address, periodStartBlock)
+        if block is not None:
+            return block + 1
+    return globalStartBlock
+
+
+def get_unlock_schedules(geyser):
+    """
+    Unlock schedules for each distribution token of a geyser, as token -> list of schedule tuples
+    """
+    unlockSchedules = {}
+    for token in geyser.getDistributionTokens():
+        unlockSchedules[str(token)] = [
+            tuple(int(value) for value in schedule)
+            for schedule in geyser.getUnlockSchedulesFor(token)
+        ]
+    return unlockSchedules
+
+
 def calculate_token_distributions(
-    geyser, geyserMock: BadgerGeyserMock, snapshotStartTime, periodEndTime
+    unlockSchedules, geyserMock: BadgerGeyserMock, snapshotStartTime, periodEndTime
 ):
     """
     Tokens to Distribute:
@@ -52,11 +205,9 @@ def calculate_token_distributions(
     - for each token, determine how many tokens will be distritbuted between the times specified
         - ((timeInClaimPeriod / totalTime) * initialLocked)
     """
-    distributionTokens = geyser.getDistributionTokens()
-    for token in distributionTokens:
+    for token, schedules in unlockSchedules.items():
         geyserMock.add_distribution_token(token)
-        unlockSchedules = geyser.getUnlockSchedulesFor(token)
-        for schedule in unlockSchedules:
+        for schedule in schedules:
             console.log(schedule)
             geyserMock.add_unlock_schedule(token, schedule)
 
@@ -71,7 +222,7 @@ def calculate_token_distributions(
 
 
 def collect_actions(geyser):
-    actions = DotMap()
+    actions = {}
     # == Process Unstaked ==
     data = fetch_all_geyser_events(geyser)
     staked = data["stakes"]
@@ -84,16 +235,17 @@ def collect_actions(geyser):
         timestamp = event["timestamp"]
         user = event["user"]
         if user != AddressZero:
-            if not actions[user][timestamp]:
-                actions[user][timestamp] = []
-            actions[user][timestamp].append(
-                DotMap(
-                    user=user,
-                    action="Stake",
-                    amount=int(event["amount"]),
-                    userTotal=int(event["total"]),
+            userActions = actions.setdefault(user, {})
+            if not timestamp in userActions:
+                userActions[timestamp] = []
+            userActions[timestamp].append(
+                StakeAction(
+                    user,
+                    "Stake",
+                    int(event["amount"]),
+                    int(event["total"]),
+                    int(event["timestamp"]),
                     stakedAt=int(event["timestamp"]),
-                    timestamp=int(event["timestamp"]),
                 )
             )
     # == Process Unstaked ==
@@ -104,21 +256,142 @@ def collect_actions(geyser):
         timestamp = event["timestamp"]
         user = event["user"]
         if user != AddressZero:
-            if not actions[user][timestamp]:
-                actions[user][timestamp] = []
-            actions[user][timestamp].append(
-                DotMap(
-                    user=user,
-                    action="Unstake",
-                    amount=int(event["amount"]),
-                    userTotal=int(event["total"]),
+            userActions = actions.setdefault(user, {})
+            if not timestamp in userActions:
+                userActions[timestamp] = []
+            userActions[timestamp].append(
+                StakeAction(
+                    user,
+                    "Unstake",
+                    int(event["amount"]),
+                    int(event["total"]),
+                    int(event["timestamp"]),
                     stakedAt=int(event["timestamp"]),
-                    timestamp=int(event["timestamp"]),
                 )
             )
     return actions
 
 
+def fetch_geyser_events(geysers, startBlock, endBlock, density=None):
+    """
+    Fetch Staked and Unstaked events for a set of geysers in a single sweep over the block range
+    Each getLogs call filters on every geyser address and either event topic, logs are demultiplexed by geyser afterwards
+    Block ranges are sized adaptively, starting from the expected density (events per block) if known
+    Returns geyser address -> events, in chain order
+    """
+    contract = web3.eth.contract(abi=BadgerGeyser.abi)
+    decoders = {}
+    for eventName in geyserEventNames:
+        event = getattr(contract.events, eventName)()
+        decoders[encode_hex(event_abi_to_log_topic(event.abi))] = (eventName, event)
+
+    addresses = [geyser.address for geyser in geysers]
+    events = {address: [] for address in addresses}
+
+    def fetch(fromBlock, toBlock):
+        return web3.eth.getLogs(
+            {
+                "address": addresses,
+                "fromBlock": fromBlock,
+                "toBlock": toBlock,
+                "topics": [list(decoders.keys())],
+            }
+        )
+
+    planner = AdaptiveRangePlanner(
+        density=density,
+        targetLogs=rewards_config.logsPerRequest,
+        maxWindow=rewards_config.maxBlocksPerRequest,
+    )
+    logs = scan_logs(
+        fetch,
+        startBlock,
+        endBlock,
+        planner,
+        workers=rewards_config.logFetchWorkers,
+        maxPerSecond=rewards_config.logRequestsPerSecond,
+    )
+    for log in logs:
+        (eventName, decoder) = decoders[encode_hex(log["topics"][0])]
+        decoded = decoder.processLog(log)
+        events[log["address"]].append(
+            {
+                "blockNumber": decoded["blockNumber"],
+                "logIndex": decoded["logIndex"],
+                "event": eventName,
+                "user": decoded["args"]["user"],
+                "amount": decoded["args"]["amount"],
+                "total": decoded["args"]["total"],
+                "timestamp": decoded["args"]["timestamp"],
+            }
+        )
+
+    return events
+
+
+def sync_geyser_events(geysers, startBlock, endBlock):
+    """
+    Get all events for a set of geysers in the block range, only fetching blocks not already in the event store
+    All geysers are caught up in one sweep, starting from the geyser furthest behind
+    Blocks within eventStoreConfirmations of the chain head are fetched every time and never persisted, in case of reorgs
+    Returns geyser address -> events, in chain order
+    """
+    store = get_event_store()
+    safeBlock = min(endBlock, chain.height - rewards_config.eventStoreConfirmations)
+
+    fetchFrom = {}
+    for geyser in geysers:
+        synced = store.get_synced_range(geyser.address)
+
+        # Stored history must start at or before the requested range to be usable
+        if synced and synced[0] > startBlock:
+            store.reset(geyser.address)
+            synced = None
+
+        fetchFrom[geyser.address] = synced[1] + 1 if synced else startBlock
+
+    behind = [geyser for geyser in geysers if fetchFrom[geyser.address] <= endBlock]
+    fresh = {}
+    if behind:
+        sweepFrom = min(fetchFrom[geyser.address] for geyser in behind)
+        console.print(
+            " Fetching new events for {} geysers".format(len(behind)),
+            {"from": sweepFrom, "to": endBlock, "safe": safeBlock},
+        )
+
+        densities = [store.get_density(geyser.address) for geyser in behind]
+        density = None if None in densities else sum(densities)
+
+        fresh = fetch_geyser_events(behind, sweepFrom, endBlock, density)
+        for geyser in behind:
+            store.record_density(
+                geyser.address, len(fresh[geyser.address]), endBlock - sweepFrom + 1
+            )
+
+    eventsByGeyser = {}
+    for geyser in geysers:
+        address = geyser.address
+        new = [
+            event
+            for event in fresh.get(address, [])
+            if event["blockNumber"] >= fetchFrom[address]
+        ]
+
+        if fetchFrom[address] <= safeBlock:
+            store.add_events(
+                address,
+                [event for event in new if event["blockNumber"] <= safeBlock],
+                fetchFrom[address],
+                safeBlock,
+            )
+
+        events = store.get_events(address, startBlock, endBlock)
+        events.extend(event for event in new if event["blockNumber"] > safeBlock)
+        eventsByGeyser[address] = events
+
+    return eventsByGeyser
+
+
 def collect_actions_from_events(geyser, startBlock, endBlock):
     """
     Construct a sequence of stake and unstake actions from events
@@ -127,55 +400,47 @@ def collect_actions_from_events(geyser, startBlock, endBlock):
     user -> timestamp -> action[]
     action: STAKE or UNSTAKE w/ parameters. (Stakes are always processed before unstakes within a given block)
     """
-    contract = web3.eth.contract(geyser.address, abi=BadgerGeyser.abi)
-    actions = DotMap()
-
-    # Add stake actions
-    for start in trange(startBlock, endBlock, 1000):
-        end = min(start + 999, endBlock)
-        logs = contract.events.Staked().getLogs(fromBlock=start, toBlock=end)
-        for log in logs:
-            timestamp = log["args"]["timestamp"]
-            user = log["args"]["user"]
-            # console.log("Staked", log["args"])
-            if user != AddressZero:
-                if not actions[user]:
-                    actions[user] = OrderedDict()
-                if not timestamp in actions[user]:
-                    actions[user][timestamp] = []
-                actions[user][timestamp].append(
-                    DotMap(
-                        user=user,
-                        action="Stake",
-                        amount=log["args"]["amount"],
-                        userTotal=log["args"]["total"],
-                        stakedAt=log["args"]["timestamp"],
-                        timestamp=log["args"]["timestamp"],
-                    )
-                )
+    events = sync_geyser_events([geyser], startBlock, endBlock)[geyser.address]
+    return events_to_actions(events)
 
-    # Add unstake actions
-    for start in trange(startBlock, endBlock, 1000):
-        end = min(start + 999, endBlock)
-        logs = contract.events.Unstaked().getLogs(fromBlock=start, toBlock=end)
-        for log in logs:
-            timestamp = log["args"]["timestamp"]
-            user = log["args"]["user"]
-            # console.log("Unstaked", log["args"])
+
+def events_to_actions(events):
+    """
+    Group chain-ordered geyser events into user -> timestamp -> action[]
+    """
+    actions = {}
+
+    # Add stake actions, then unstake actions
+    for eventName in geyserEventNames:
+        for event in events:
+            if event["event"] != eventName:
+                continue
+            timestamp = event["timestamp"]
+            user = event["user"]
             if user != AddressZero:
-                if not actions[user]:
+                if user not in actions:
                     actions[user] = OrderedDict()
                 if not timestamp in actions[user]:
                     actions[user][timestamp] = []
-                actions[user][timestamp].append(
-                    DotMap(
-                        user=user,
-                        action="Unstake",
-                        amount=log["args"]["amount"],
-                        userTotal=log["args"]["total"],
-                        timestamp=log["args"]["timestamp"],
+                if eventName == "Staked":
+                    action = StakeAction(
+                        user,
+                        "Stake",
+                        event["amount"],
+                        event["total"],
+                        event["timestamp"],
+                        stakedAt=event["timestamp"],
                     )
-                )
+                else:
+                    action = StakeAction(
+                        user,
+                        "Unstake",
+                        event["amount"],
+                        event["total"],
+                        event["timestamp"],
+                    )
+                actions[user][timestamp].append(action)
+
     # Sort timestamps within each user
     for user, timestamps in actions.items():
         sortedDict = OrderedDict(sorted(timestamps.items()))
@@ -191,9 +456,20 @@ def process_actions(
     Remove stakes according to unstaking rules (LIFO)
     """
     console.print("[green]== Processing Claim Period Actions ==[/green]\n")
+    apply_actions(geyserMock, actions)
+
+    # End accounting for each user
+    for user in actions:
+        geyserMock.calc_end_share_seconds_for(user)
+
+    return geyserMock
+
+
+def apply_actions(geyserMock: BadgerGeyserMock, actions):
+    """
+    Apply stake and unstake actions in order, without end of period accounting
+    """
     for user, userData in actions.items():
-        table = []
-        # console.print("\n= Processing actions for user: ", user + " =")
         latestTimestamp = 0
 
         # Iterate over actions, grouped by timestamp
@@ -201,24 +477,11 @@ def process_actions(
             assert int(timestamp) > latestTimestamp
             for action in timestampEntries:
                 if action.action == "Stake":
-                    table.append(["stake", action["amount"], action["timestamp"]])
                     geyserMock.stake(action.user, action)
                 if action.action == "Unstake":
-                    table.append(["unstake", action["amount"], action["timestamp"]])
                     geyserMock.unstake(action.user, action)
             latestTimestamp = int(timestamp)
 
-        # End accounting for user
-        geyserMock.calc_end_share_seconds_for(user)
-
-        # Print results
-        # print(tabulate(table, headers=["action", "amount", "timestamp"]))
-        # print("\n")
-        user = geyserMock.users[user]
-        table = []
-        table.append([user.shareSecondsInRange, user.shareSeconds, user.total])
-        # print(tabulate(table, headers=["shareSecondsInRange", "shareSeconds", "total"]))
-
     return geyserMock
 
 
@@ -0,0 +1,68 @@
+import random
+
+from assistant.rewards.config import rewards_config
+from eth_utils.hexadecimal import encode_hex
+
+"""
+Local encoding of BadgerTree claim leaves, so building the tree needs no RPC calls
+
+Matches abi.encodePacked(index, account, cycle, tokens, cumulativeAmounts) in BadgerTree / ClaimEncoder:
+uint256s are 32 bytes, account is 20 bytes, and elements of the packed address[] are padded to 32 bytes each
+"""
+
+
+def encode_uint256(value):
+    return int(value).to_bytes(32, "big")
+
+
+def encode_address(address):
+    encoded = bytes.fromhex(address[2:])
+    assert len(encoded) == 20, "Invalid address {}".format(address)
+    return encoded
+
+
+def encode_claim(tokens, cumulativeAmounts, index, cycle, account):
+    """
+    Packed claim bytes, same arguments as ClaimEncoder.encodeClaim
+    """
+    return b"".join(
+        [
+            encode_uint256(index),
+            encode_address(account),
+            encode_uint256(cycle),
+            b"".join(encode_address(token).rjust(32, b"\0") for token in tokens),
+            b"".join(encode_uint256(amount) for amount in cumulativeAmounts),
+        ]
+    )
+
+
+class ClaimEncoderCheck:
+    """
+    Compare a sample of locally encoded claims with the on-chain ClaimEncoder
+    """
+
+    def __init__(self, rate=None, seed=None):
+        self.rate = rewards_config.claimEncoderCheckRate if rate is None else rate
+        self.rng = random.Random(seed)
+        self.encoder = None
+        self.checked = 0
+
+    def maybe_check(self, nodeEntry, encoded):
+        if self.rate <= 0 or self.rng.random() >= self.rate:
+            return
+        if not self.encoder:
+            from brownie import ClaimEncoder
+
+            self.encoder = ClaimEncoder.at(rewards_config.claimEncoderAddress)
+
+        expected = self.encoder.encodeClaim(
+            nodeEntry["tokens"],
+            nodeEntry["cumulativeAmounts"],
+            nodeEntry["index"],
+            nodeEntry["cycle"],
+            nodeEntry["user"],
+        )[0]
+        assert encode_hex(expected) == encoded, "Claim encoding mismatch for {}".format(
+            nodeEntry["user"]
+        )
+        self.checked += 1
@@ -0,0 +1,176 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+from assistant.rewards.rewards_file import JsonStream
+
+"""
+Sorted address -> offset index for a finished rewards JSON file, and a memory mapped reader
+
+<rewards file>.idx: magic, claim count, then one 32 byte record per claim sorted by address:
+    20 byte address, byte offset and length of the claim's JSON object in the rewards file
+A lookup is a binary search over the mapped index and a json.loads of one claim, so memory stays flat however many lookups run
+Rewards files are ASCII (json.dumps escapes everything else), so character offsets are byte offsets
+"""
+
+magic = b"BRIX"
+headerSize = 8
+recordSize = 32
+record = struct.Struct("<20sQI")
+
+
+def index_file_name(rewardsFile):
+    return rewardsFile + ".idx"
+
+
+def build_claim_index(rewardsFile, indexFile=None):
+    """
+    Scan a rewards file once, recording where each claim starts and ends
+    """
+    entries = []
+    with open(rewardsFile) as f:
+        stream = JsonStream(f)
+        for key in stream.items():
+            if key != "claims":
+                stream.value()
+                continue
+            for user in stream.items():
+                stream.peek()
+                start = stream.offset()
+                stream.value()
+                entries.append(
+                    (bytes.fromhex(user[2:]), start, stream.offset() - start)
+                )
+
+    entries.sort()
+    indexFile = indexFile or index_file_name(rewardsFile)
+    # Other processes may build the same index, each writes its own temporary file
+    tmpFile = "{}.{}.tmp".format(indexFile, os.getpid())
+    with open(tmpFile, "wb") as f:
+        f.write(magic + struct.pack("<I", len(entries)))
+        for entry in entries:
+            f.write(record.pack(*entry) + b"\0" * (recordSize - record.size))
+    os.replace(tmpFile, indexFile)
+    return indexFile
+
+
+def open_claim_index(indexFile):
+    """
+    Map an index file, or return None if it's missing, truncated or not an index
+    """
+    try:
+        with open(indexFile, "rb") as f:
+            if os.fstat(f.fileno()).st_size < headerSize:
+                return None
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+    (numClaims,) = struct.unpack_from("<I", index, 4)
+    if index[:4] != magic or len(index) != headerSize + numClaims * recordSize:
+        index.close()
+        return None
+    return index
+
+
+class ClaimIndex:
+    """
+    Look up claims in a rewards file through its index, building the index if it doesn't exist or is invalid
+    """
+
+    def __init__(self, rewardsFile, indexFile=None):
+        indexFile = indexFile or index_file_name(rewardsFile)
+        self.index = open_claim_index(indexFile)
+        if self.index is None:
+            build_claim_index(rewardsFile, indexFile)
+            self.index = open_claim_index(indexFile)
+        if self.index is None:
+            raise ValueError("Invalid claim index: " + indexFile)
+        (self.numClaims,) = struct.unpack_from("<I", self.index, 4)
+
+        with open(rewardsFile, "rb") as f:
+            self.rewards = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.numClaims
+
+    def __contains__(self, user):
+        return self.find(user) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.rewards.close()
+        self.index.close()
+
+    def entry(self, position):
+        return record.unpack_from(self.index, headerSize + position * recordSize)
+
+    def find(self, user):
+        """
+        Binary search for a user's record, returns (offset, length) or None
+        """
+        address = bytes.fromhex(user[2:].lower())
+        (low, high) = (0, self.numClaims)
+        while low < high:
+            mid = (low + high) // 2
+            if self.entry(mid)[0] < address:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.numClaims:
+            return None
+        (found, offset, length) = self.entry(low)
+        return (offset, length) if found == address else None
+
+    def read(self, offset, length):
+        return json.loads(self.rewards[offset : offset + length])
+
+    def get_claim(self, user):
+        """
+        A user's claim with tokens, cumulativeAmounts, index, cycle and proof, or None
+        """
+        location = self.find(user)
+        return self.read(*location) if location else None
+
+    def items(self):
+        """
+        Every (user, claim), in address order
+        """
+        for position in range(self.numClaims):
+            (address, offset, length) = self.entry(position)
+            claim = self.read(offset, length)
+            yield (claim["user"], claim)
+
+
+class IndexedClaims(Mapping):
+    """
+    Read only {user: claim} view of a rewards file through its index, iterated in address order
+    """
+
+    def __init__(self, claimIndex):
+        self.claimIndex = claimIndex
+
+    def __getitem__(self, user):
+        claim = self.claimIndex.get_claim(user)
+        if claim is None:
+            raise KeyError(user)
+        return claim
+
+    def __iter__(self):
+        return (user for user, claim in self.claimIndex.items())
+
+    def __len__(self):
+        return len(self.claimIndex)
+
+    def __contains__(self, user):
+        return user in self.claimIndex
+
+    def items(self):
+        return self.claimIndex.items()
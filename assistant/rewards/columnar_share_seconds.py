@@ -0,0 +1,110 @@
+import numpy as np
+from helpers.constants import AddressZero
+
+"""
+Columnar share seconds engine, an alternative to replaying events through BadgerGeyserMock
+
+A geyser's whole history is loaded into arrays (user, timestamp, signed amount), sorted once, and reduced per user
+Amounts don't fit in 64 bits, so they are kept as Python ints and only used in the final per-user reduction:
+    sum over events of (staked before event * weight of event) == sum over stakes of (amount * sum of weights of later events)
+All weights are int64, only the amount * weight products are Python ints
+"""
+
+
+def weighted_seconds(elapsed, timestamps):
+    """
+    Vectorised BadgerGeyserMock.calculate_weighted_seconds, called with the same arguments as process_share_seconds does
+    """
+    return timestamps - elapsed
+
+
+def group_suffix_sums(values, groupEnds, groupIds):
+    """
+    For each entry, the sum of the values after it within its group
+    """
+    cumulative = np.cumsum(values)
+    return cumulative[groupEnds][groupIds] - cumulative
+
+
+def columnar_share_seconds(events, startTime, endTime):
+    """
+    Compute shareSeconds and shareSecondsInRange for every user from a geyser's full event history, in chain order
+    Gives the same results as applying the events to a BadgerGeyserMock and running end of period accounting for each user
+    Returns (users, shareSeconds, shareSecondsInRange), with users in the order events_to_actions sees them
+    """
+    events = [event for event in events if event["user"] != AddressZero]
+    numEvents = len(events)
+    if numEvents == 0:
+        return ([], [], [])
+
+    isUnstake = np.array(
+        [event["event"] == "Unstaked" for event in events], dtype=np.int64
+    )
+    timestamps = np.array([event["timestamp"] for event in events], dtype=np.int64)
+    amounts = np.array(
+        [
+            -event["amount"] if event["event"] == "Unstaked" else event["amount"]
+            for event in events
+        ],
+        dtype=object,
+    )
+    position = np.arange(numEvents, dtype=np.int64)
+
+    # Users ordered by their first stake, then by first unstake, like events_to_actions
+    (uniqueUsers, userIndex) = np.unique(
+        np.array([event["user"] for event in events]), return_inverse=True
+    )
+    numUsers = len(uniqueUsers)
+    firstSeen = np.full(numUsers, 2 * numEvents, dtype=np.int64)
+    np.minimum.at(firstSeen, userIndex, isUnstake * numEvents + position)
+    userOrder = np.argsort(firstSeen, kind="stable")
+    userRank = np.empty(numUsers, dtype=np.int64)
+    userRank[userOrder] = np.arange(numUsers)
+
+    # One end of period entry per user, which stakes nothing
+    userRank = np.concatenate([userRank[userIndex], np.arange(numUsers)])
+    timestamps = np.concatenate([timestamps, np.full(numUsers, endTime)])
+    kind = np.concatenate([isUnstake, np.full(numUsers, 2)])
+    position = np.concatenate(
+        [position, np.arange(numEvents, numEvents + numUsers, dtype=np.int64)]
+    )
+    amounts = np.concatenate([amounts, np.zeros(numUsers, dtype=object)])
+
+    # Group by user, then timestamp, with stakes before unstakes, then chain order
+    order = np.lexsort((position, kind, timestamps, userRank))
+    userRank = userRank[order]
+    timestamps = timestamps[order]
+    amounts = amounts[order]
+
+    # Each entry weights the stake held since the user's previous entry, unless no time has passed
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = userRank[1:] != userRank[:-1]
+    previous = np.zeros(len(order), dtype=np.int64)
+    previous[1:] = timestamps[:-1]
+    counted = ~first & (timestamps != previous)
+
+    weights = np.where(counted, weighted_seconds(timestamps - previous, timestamps), 0)
+    gated = np.maximum(startTime, previous)
+    weightsInRange = np.where(
+        counted & (timestamps > startTime),
+        weighted_seconds(timestamps - gated, timestamps),
+        0,
+    )
+
+    groupStarts = np.flatnonzero(first)
+    groupEnds = np.append(groupStarts[1:], len(order)) - 1
+    groupIds = np.cumsum(first) - 1
+
+    laterWeights = group_suffix_sums(weights, groupEnds, groupIds).astype(object)
+    laterWeightsInRange = group_suffix_sums(weightsInRange, groupEnds, groupIds).astype(
+        object
+    )
+
+    shareSeconds = np.add.reduceat(amounts * laterWeights, groupStarts)
+    shareSecondsInRange = np.add.reduceat(amounts * laterWeightsInRange, groupStarts)
+
+    return (
+        [str(user) for user in uniqueUsers[userOrder]],
+        [int(value) for value in shareSeconds],
+        [int(value) for value in shareSecondsInRange],
+    )
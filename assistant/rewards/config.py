@@ -1,6 +1,52 @@
-from helpers.time_utils import hours
+from helpers.time_utils import days, hours
 from dotmap import DotMap
 
 rewards_config = DotMap(
-    globalStakingStartBlock=11252068, rootUpdateInterval=hours(2) - 300,
+    globalStakingStartBlock=11252068,
+    rootUpdateInterval=hours(2) - 300,
+    # Local cache of geyser events, only blocks with enough confirmations are persisted
+    eventStorePath="data/geyser_events.sqlite",
+    eventStoreConfirmations=20,
+    blockCachePath="data/blocks.sqlite",
+    # Geyser state checkpoints, so each cycle only replays new events
+    geyserCheckpoints=True,
+    checkpointDir="data/checkpoints",
+    checkpointsToKeep=48,
+    # "mock" replays events through BadgerGeyserMock, "columnar" computes share seconds with numpy over the full history
+    shareSecondsEngine="mock",
+    # Compute geysers in a process pool, set to 1 to compute them one at a time
+    geyserWorkers=8,
+    # getLogs block ranges adapt to aim for this many logs per request
+    logsPerRequest=2000,
+    maxBlocksPerRequest=100000,
+    # Concurrent getLogs requests, set workers to 1 to fetch sequentially
+    logFetchWorkers=4,
+    logRequestsPerSecond=25,
+    # Hash and build the lower merkle tree layers in a process pool, set to 1 to build serially
+    merkleWorkers=4,
+    # Read the previous tree's claims through its claim index instead of loading them
+    streamPreviousTree=True,
+    # Stage results on disk under a hash of their inputs, shared by re-runs and keepers with the same directory
+    stageCache=True,
+    stageCacheDir="data/stage_cache",
+    stageCacheMaxAge=days(7),
+    stageCacheMaxBytes=4 * 1024 ** 3,
+    # The guardian recomputes every stage without the stage cache. If unset it reuses the root updater's
+    # stages up to the cumulative ledger, from this process or a shared stage cache, and only rebuilds the merkle tree
+    guardianStrictRecompute=True,
+    # Also publish a sorted address -> offset index of each JSON rewards file, for single claim lookups
+    rewardsIndex=True,
+    # Also publish a zstd compressed binary rewards tree next to each JSON file
+    rewardsArtifact=True,
+    # Also publish claims in shards by first address byte, with a manifest, for single claim lookups
+    rewardsShards=False,
+    # Also publish each user's new rewards by source (geyser key), indexed by user, to explain claim changes
+    rewardsAttribution=True,
+    # Proof server, reloads when the approved root changes
+    proofServerHost="0.0.0.0",
+    proofServerPort=8080,
+    proofServerPollInterval=60,
+    # Claims are encoded locally, this fraction is also checked against the deployed ClaimEncoder
+    claimEncoderCheckRate=0.01,
+    claimEncoderAddress="0x19be80e976cb397ae584d350153914ced7c1b1d2",
 )
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+
+from assistant.rewards.config import rewards_config
+from rich.console import Console
+
+console = Console()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    geyser TEXT NOT NULL,
+    blockNumber INTEGER NOT NULL,
+    logIndex INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    user TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    total TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (geyser, blockNumber, logIndex)
+);
+CREATE TABLE IF NOT EXISTS sync (
+    geyser TEXT PRIMARY KEY,
+    fromBlock INTEGER NOT NULL,
+    toBlock INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS density (
+    geyser TEXT PRIMARY KEY,
+    logs INTEGER NOT NULL,
+    blocks INTEGER NOT NULL
+);
+"""
+
+
+class GeyserEventStore:
+    """
+    On-disk store of decoded geyser Staked / Unstaked events
+    Each geyser has a synced range [fromBlock, toBlock]: every event in that range is in the store, so a cycle only needs to fetch blocks after toBlock
+    Amounts are stored as decimal strings, they don't fit in a sqlite integer
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def get_synced_range(self, geyser):
+        """
+        Return the (fromBlock, toBlock) range fully synced for a geyser, or None if nothing is stored
+        """
+        row = self.db.execute(
+            "SELECT fromBlock, toBlock FROM sync WHERE geyser = ?", (str(geyser),)
+        ).fetchone()
+        if not row:
+            return None
+        return (row[0], row[1])
+
+    def add_events(self, geyser, events, fromBlock, toBlock):
+        """
+        Store events for a geyser and extend its synced range to toBlock, in a single transaction
+        The range must start at fromBlock or continue directly from the stored range
+        """
+        geyser = str(geyser)
+        synced = self.get_synced_range(geyser)
+        if synced:
+            assert fromBlock == synced[1] + 1
+            fromBlock = synced[0]
+
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        geyser,
+                        event["blockNumber"],
+                        event["logIndex"],
+                        event["event"],
+                        event["user"],
+                        str(event["amount"]),
+                        str(event["total"]),
+                        event["timestamp"],
+                    )
+                    for event in events
+                ],
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync VALUES (?, ?, ?)",
+                (geyser, fromBlock, toBlock),
+            )
+
+    def get_events(self, geyser, startBlock, endBlock):
+        """
+        Get stored events for a geyser in the block range (inclusive), in chain order
+        """
+        rows = self.db.execute(
+            "SELECT blockNumber, logIndex, event, user, amount, total, timestamp FROM events "
+            "WHERE geyser = ? AND blockNumber >= ? AND blockNumber <= ? "
+            "ORDER BY blockNumber, logIndex",
+            (str(geyser), startBlock, endBlock),
+        )
+        return [
+            {
+                "blockNumber": row[0],
+                "logIndex": row[1],
+                "event": row[2],
+                "user": row[3],
+                "amount": int(row[4]),
+                "total": int(row[5]),
+                "timestamp": row[6],
+            }
+            for row in rows
+        ]
+
+    def get_density(self, geyser):
+        """
+        Average events per block seen while fetching for a geyser, or None if it was never fetched
+        """
+        row = self.db.execute(
+            "SELECT logs, blocks FROM density WHERE geyser = ?", (str(geyser),)
+        ).fetchone()
+        if not row or row[1] == 0:
+            return None
+        return row[0] / row[1]
+
+    def record_density(self, geyser, logs, blocks):
+        """
+        Add the number of events found over a fetched block range to the geyser's density hint
+        """
+        with self.db:
+            self.db.execute(
+                "INSERT INTO density VALUES (?, ?, ?) ON CONFLICT(geyser) "
+                "DO UPDATE SET logs = logs + excluded.logs, blocks = blocks + excluded.blocks",
+                (str(geyser), logs, blocks),
+            )
+
+    def reset(self, geyser):
+        """
+        Drop all stored events for a geyser
+        """
+        with self.db:
+            self.db.execute("DELETE FROM events WHERE geyser = ?", (str(geyser),))
+            self.db.execute("DELETE FROM sync WHERE geyser = ?", (str(geyser),))
+
+
+eventStore = None
+
+
+def get_event_store():
+    global eventStore
+    if not eventStore:
+        eventStore = GeyserEventStore(rewards_config.eventStorePath)
+    return eventStore
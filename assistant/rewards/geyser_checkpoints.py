@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+
+from assistant.rewards.config import rewards_config
+from rich.console import Console
+
+console = Console()
+
+"""
+Checkpoints of BadgerGeyserMock state, so a cycle only replays events since the last checkpoint
+
+A checkpoint is the state after applying every event up to and including its block, before any end of period accounting
+Each checkpoint is tagged with a hash of its inputs: the parent checkpoint's hash and the events applied on top of it
+On load the hash is recomputed from the events now on record, so a checkpoint built on reorged or since corrected events is skipped
+"""
+
+
+def canonical_hash(value):
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def hash_inputs(geyser, parentHash, fromBlock, toBlock, events):
+    return canonical_hash(
+        {
+            "geyser": str(geyser),
+            "parent": parentHash,
+            "fromBlock": fromBlock,
+            "toBlock": toBlock,
+            "events": [
+                [
+                    event["blockNumber"],
+                    event["logIndex"],
+                    event["event"],
+                    event["user"],
+                    str(event["amount"]),
+                    str(event["total"]),
+                    event["timestamp"],
+                ]
+                for event in events
+            ],
+        }
+    )
+
+
+def checkpoint_dir(geyser):
+    return os.path.join(rewards_config.checkpointDir, str(geyser))
+
+
+def save_checkpoint(geyser, block, state, parent, fromBlock, events):
+    """
+    Write the state of a geyser at a block, replacing any existing checkpoint at that block
+    """
+    parentHash = parent["inputsHash"] if parent else None
+    checkpoint = {
+        "geyser": str(geyser),
+        "block": block,
+        "parentBlock": parent["block"] if parent else None,
+        "parentHash": parentHash,
+        "fromBlock": fromBlock,
+        "inputsHash": hash_inputs(geyser, parentHash, fromBlock, block, events),
+        "stateHash": canonical_hash(state),
+        "state": state,
+    }
+
+    directory = checkpoint_dir(geyser)
+    os.makedirs(directory, exist_ok=True)
+    fileName = os.path.join(directory, "{}.json".format(block))
+    with open(fileName + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(fileName + ".tmp", fileName)
+
+    prune_checkpoints(geyser)
+    return checkpoint
+
+
+def list_checkpoint_blocks(geyser):
+    directory = checkpoint_dir(geyser)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(fileName[: -len(".json")])
+        for fileName in os.listdir(directory)
+        if fileName.endswith(".json")
+    )
+
+
+def latest_checkpoint_block(geyser, beforeBlock):
+    """
+    Block of the latest checkpoint strictly before a block, without loading it
+    """
+    blocks = [block for block in list_checkpoint_blocks(geyser) if block < beforeBlock]
+    return blocks[-1] if blocks else None
+
+
+def read_checkpoint(geyser, block):
+    fileName = os.path.join(checkpoint_dir(geyser), "{}.json".format(block))
+    if not os.path.isfile(fileName):
+        return None
+    with open(fileName) as f:
+        return json.load(f)
+
+
+def verify_inputs(geyser, checkpoint, get_events):
+    """
+    Check a checkpoint's inputs hash against the events on record for its range, and its parent link if the parent is still kept
+    """
+    if "fromBlock" not in checkpoint:
+        return False
+    events = get_events(checkpoint["fromBlock"], checkpoint["block"])
+    inputsHash = hash_inputs(
+        geyser,
+        checkpoint["parentHash"],
+        checkpoint["fromBlock"],
+        checkpoint["block"],
+        events,
+    )
+    if inputsHash != checkpoint["inputsHash"]:
+        return False
+
+    if checkpoint["parentBlock"] is not None:
+        parent = read_checkpoint(geyser, checkpoint["parentBlock"])
+        if parent and parent["inputsHash"] != checkpoint["parentHash"]:
+            return False
+    return True
+
+
+def load_checkpoint(geyser, beforeBlock, get_events=None):
+    """
+    Load the latest checkpoint strictly before a block, skipping any that fail their integrity check
+    get_events(fromBlock, toBlock) returns the geyser's events on record, if given each checkpoint's inputs hash is checked against them
+    """
+    for block in reversed(list_checkpoint_blocks(geyser)):
+        if block >= beforeBlock:
+            continue
+
+        fileName = os.path.join(checkpoint_dir(geyser), "{}.json".format(block))
+        checkpoint = read_checkpoint(geyser, block)
+
+        if checkpoint["stateHash"] != canonical_hash(checkpoint["state"]):
+            console.print(
+                "[bold red]Corrupt geyser checkpoint " + fileName + "[/bold red]"
+            )
+            continue
+        if get_events and not verify_inputs(geyser, checkpoint, get_events):
+            console.print(
+                "[bold red]Geyser checkpoint "
+                + fileName
+                + " doesn't match the events on record[/bold red]"
+            )
+            continue
+        return checkpoint
+
+    return None
+
+
+def prune_checkpoints(geyser):
+    blocks = list_checkpoint_blocks(geyser)
+    for block in blocks[: -rewards_config.checkpointsToKeep]:
+        os.remove(os.path.join(checkpoint_dir(geyser), "{}.json".format(block)))
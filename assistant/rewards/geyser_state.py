@@ -0,0 +1,52 @@
+"""
+Compact records for geyser replay state
+Plain classes with __slots__: no per-instance dict, and reading a missing field is an error rather than an auto-created entry
+"""
+
+
+class UserStake:
+    __slots__ = ("amount", "stakedAt")
+
+    def __init__(self, amount, stakedAt):
+        self.amount = amount
+        self.stakedAt = stakedAt
+
+
+class StakeAction:
+    """
+    A Stake or Unstake by a user. stakedAt is only set for stakes
+    """
+
+    __slots__ = ("user", "action", "amount", "userTotal", "stakedAt", "timestamp")
+
+    def __init__(self, user, action, amount, userTotal, timestamp, stakedAt=None):
+        self.user = user
+        self.action = action
+        self.amount = amount
+        self.userTotal = userTotal
+        self.timestamp = timestamp
+        self.stakedAt = stakedAt
+
+
+class UserGeyserState:
+    """
+    Open stakes (LIFO) and share seconds for a user in a geyser
+    total is None until the user's first action
+    """
+
+    __slots__ = (
+        "stakes",
+        "stakedAmount",
+        "total",
+        "lastUpdate",
+        "shareSeconds",
+        "shareSecondsInRange",
+    )
+
+    def __init__(self):
+        self.stakes = []
+        self.stakedAmount = 0
+        self.total = None
+        self.lastUpdate = 0
+        self.shareSeconds = 0
+        self.shareSecondsInRange = 0
@@ -1,9 +1,9 @@
-from itertools import zip_longest
-
+from assistant.rewards.config import rewards_config
 from brownie import *
 from eth_utils import encode_hex
 from eth_utils.hexadecimal import encode_hex
 from helpers.constants import *
+from helpers.merkle import MerkleTree
 from rich.console import Console
 
 console = Console()
@@ -13,67 +13,17 @@ Convert merkle_tree
 """
 
 
-class MerkleTree:
-    def __init__(self, elements):
-        self.elements = sorted(set(web3.keccak(hexstr=el) for el in elements))
-        self.layers = MerkleTree.get_layers(self.elements)
-
-        # console.log(self.elements, self.layers)
-
-    @property
-    def root(self):
-        return self.layers[-1][0]
-
-    def get_proof(self, el):
-        el = web3.keccak(hexstr=el)
-        idx = self.elements.index(el)
-        proof = []
-        for layer in self.layers:
-            pair_idx = idx + 1 if idx % 2 == 0 else idx - 1
-            if pair_idx < len(layer):
-                proof.append(encode_hex(layer[pair_idx]))
-            idx //= 2
-        return proof
-
-    @staticmethod
-    def get_layers(elements):
-        layers = [elements]
-        while len(layers[-1]) > 1:
-            layers.append(MerkleTree.get_next_layer(layers[-1]))
-        return layers
-
-    @staticmethod
-    def get_next_layer(elements):
-        return [
-            MerkleTree.combined_hash(a, b)
-            for a, b in zip_longest(elements[::2], elements[1::2])
-        ]
-
-    @staticmethod
-    def combined_hash(a, b):
-        if a is None:
-            return b
-        if b is None:
-            return a
-        return web3.keccak(b"".join(sorted([a, b])))
-
-
-def rewards_to_merkle_tree(rewards, startBlock, endBlock, geyserRewards):
-    (nodes, encodedNodes, entries) = rewards.to_merkle_format()
-
-    # For each user, encode their data into a node
-
-    # Put the nodes into a tree
-
-    # elements = [(index, account, amount) for index, (account, amount) in enumerate(rewards.items())]
-    # nodes = [encode_hex(encode_abi_packed(['uint', 'address', 'uint'], el)) for el in elements]
+def build_merkle_distribution(
+    rewards, startBlock, endBlock, geyserRewards, previousTree=None
+):
     """
-    'claims': {
-            user: {'index': index, 'amount': hex(amount), 'proof': tree.get_proof(nodes[index])}
-            for index, user, amount in elements
-        },
+    Build the tree and the distribution without proofs, proofs are produced one claim at a time by iter_claims_with_proofs
+    previousTree is the last published tree, users keep their index from it
+    Returns (distribution, tree)
     """
-    tree = MerkleTree(encodedNodes)
+    (nodes, encodedNodes, entries) = rewards.to_merkle_format(previousTree)
+
+    tree = MerkleTree.build(encodedNodes, workers=rewards_config.merkleWorkers)
     distribution = {
         "merkleRoot": encode_hex(tree.root),
         "cycle": nodes[0]["cycle"],
@@ -86,26 +36,44 @@ def rewards_to_merkle_tree(rewards, startBlock, endBlock, geyserRewards):
 
     for entry in entries:
         node = entry["node"]
-        encoded = entry["encoded"]
-        # console.log(node)
         distribution["claims"][node["user"]] = {
             "index": hex(node["index"]),
             "user": node["user"],
             "cycle": hex(node["cycle"]),
             "tokens": node["tokens"],
             "cumulativeAmounts": node["cumulativeAmounts"],
-            "proof": tree.get_proof(encodedNodes[node["index"]]),
-            "node": encoded,
+            "node": entry["encoded"],
         }
 
     for user, data in geyserRewards.metadata.items():
         distribution["metadata"][user] = data.toDict()
 
     print(f"merkle root: {encode_hex(tree.root)}")
+    return (distribution, tree)
 
-    # Print to file with content hash
-    # hash(distribution)
-
-    # console.log(distribution)
 
+def iter_claims_with_proofs(distribution, tree, proofs=None):
+    """
+    Yield (user, claim) with each claim's proof, in the published field order
+    proofs are the tree's get_all_proofs(), computed here if not given
+    """
+    if proofs is None:
+        proofs = tree.get_all_proofs()
+    for user, claim in distribution["claims"].items():
+        withProof = {key: value for key, value in claim.items() if key != "node"}
+        withProof["proof"] = proofs[tree.get_position(claim["node"])]
+        withProof["node"] = claim["node"]
+        yield (user, withProof)
+
+
+def rewards_to_merkle_tree(
+    rewards, startBlock, endBlock, geyserRewards, previousTree=None
+):
+    """
+    The full distribution with every proof in memory
+    """
+    (distribution, tree) = build_merkle_distribution(
+        rewards, startBlock, endBlock, geyserRewards, previousTree
+    )
+    distribution["claims"] = dict(iter_claims_with_proofs(distribution, tree))
     return distribution
@@ -0,0 +1,171 @@
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from assistant.rewards.claim_index import ClaimIndex
+from assistant.rewards.rewards_file import read_header
+from rich.console import Console
+
+console = Console()
+
+"""
+HTTP proof service over the latest rewards file and its claim index
+
+GET /proof/<address>  the claim with tokens, cumulativeAmounts, index, cycle and proof
+GET /root             merkleRoot, cycle and blocks of the file being served
+GET /metrics          request counts and latency percentiles
+
+Claims are sent as the raw bytes of the mapped rewards file, found by binary search of the index
+reload() swaps in a new file and index in one assignment, requests in flight finish on the one they started with
+"""
+
+addressPattern = re.compile(r"^/proof/(0x[0-9a-fA-F]{40})$")
+
+
+class RewardsSnapshot:
+    """
+    A rewards file, its index and header, replaced together on reload
+    """
+
+    def __init__(self, rewardsFile):
+        self.rewardsFile = rewardsFile
+        self.claims = ClaimIndex(rewardsFile)
+        self.header = read_header(rewardsFile)
+        self.rootBody = json.dumps(
+            {
+                "merkleRoot": self.header.get("merkleRoot"),
+                "cycle": self.header.get("cycle"),
+                "startBlock": self.header.get("startBlock"),
+                "endBlock": self.header.get("endBlock"),
+                "claims": len(self.claims),
+            }
+        ).encode()
+
+    def get_claim_bytes(self, user):
+        location = self.claims.find(user)
+        if not location:
+            return None
+        (offset, length) = location
+        return memoryview(self.claims.rewards)[offset : offset + length]
+
+
+class LatencyMetrics:
+    """
+    Request counts and a window of recent latencies
+    """
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.counts = {}
+        self.started = time.time()
+
+    def record(self, route, status, seconds):
+        with self.lock:
+            key = "{} {}".format(route, status)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+
+        return {
+            "uptimeSeconds": time.time() - self.started,
+            "requests": counts,
+            "latencyMs": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": latencies[-1] * 1e3 if latencies else 0,
+            },
+        }
+
+
+class ProofRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, don't let Nagle hold the body back on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        start = time.perf_counter()
+        (route, status) = self.route()
+        self.server.metrics.record(route, status, time.perf_counter() - start)
+
+    def route(self):
+        snapshot = self.server.snapshot
+        if self.path == "/root":
+            return ("root", self.respond(200, snapshot.rootBody))
+        if self.path == "/metrics":
+            metrics = self.server.metrics.snapshot()
+            metrics["rewardsFile"] = snapshot.rewardsFile
+            return ("metrics", self.respond(200, json.dumps(metrics).encode()))
+
+        match = addressPattern.match(self.path)
+        if not match:
+            return ("unknown", self.respond(404, b'{"error": "not found"}'))
+        claim = snapshot.get_claim_bytes(match.group(1))
+        if claim is None:
+            return ("proof", self.respond(404, b'{"error": "no claim"}'))
+        return ("proof", self.respond(200, claim))
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ProofServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rewardsFile):
+        self.snapshot = RewardsSnapshot(rewardsFile)
+        self.metrics = LatencyMetrics()
+        super().__init__(address, ProofRequestHandler)
+
+    def reload(self, rewardsFile):
+        """
+        Serve a new rewards file. The old file stays mapped until the last request using it lets go
+        """
+        if rewardsFile == self.snapshot.rewardsFile:
+            return False
+        self.snapshot = RewardsSnapshot(rewardsFile)
+        console.print(
+            "[green]Serving {} (cycle {})[/green]".format(
+                rewardsFile, self.snapshot.header.get("cycle")
+            )
+        )
+        return True
+
+
+def watch_latest(server, resolve_latest, interval=60):
+    """
+    Reload whenever resolve_latest() names a different rewards file, in a daemon thread
+    """
+
+    def poll():
+        while True:
+            time.sleep(interval)
+            try:
+                server.reload(resolve_latest())
+            except Exception as e:
+                console.print("[red]Proof server reload failed: {}[/red]".format(e))
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    return thread
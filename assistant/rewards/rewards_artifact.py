@@ -0,0 +1,226 @@
+import json
+import struct
+
+import zstandard
+from assistant.rewards.claim_encoder import encode_claim
+from eth_utils.hexadecimal import encode_hex
+from helpers.merkle import MerkleTree, keccak, nodeSize
+
+"""
+Compact binary rewards tree, published next to the JSON file
+
+zstd compressed, little endian:
+    magic, version
+    header: length prefixed JSON of merkleRoot, cycle, startBlock, endBlock, tokenTotals, metadata
+    token table: count, 20 byte addresses
+    claims: count, then per claim 20 byte account, index, leaf position, token count, (token id, 32 byte amount) per token
+    tree: layer count, then per layer node count and 32 byte nodes
+
+Proofs aren't stored per claim, they're read from the tree layers by leaf position, so shared nodes are stored once
+Nodes aren't stored either, decoding re-encodes each claim and rebuilds the tree, so a decoded artifact is checked against its root
+The artifact's content hash is keccak256 of the compressed bytes
+"""
+
+magic = b"BRWD"
+version = 1
+compressionLevel = 10
+
+
+# Case bit (0x20) for hex letters, and for hash nibbles of 8 and above
+letterCaseBit = bytes(0x20 if chr(i) in "abcdef" else 0 for i in range(256))
+hashCaseBit = bytes(0x20 if chr(i) in "89abcdef" else 0 for i in range(256))
+
+
+def checksum_address(address):
+    """
+    EIP-55 checksummed hex of 20 address bytes, without eth_utils' input validation
+    Letters are uppercased where the matching nibble of the hash is 8 or more, as byte masks rather than per character
+    """
+    lower = address.hex().encode()
+    upperBits = int.from_bytes(lower.translate(letterCaseBit), "big") & int.from_bytes(
+        keccak(lower).hex()[:40].encode().translate(hashCaseBit), "big"
+    )
+    return (
+        "0x" + (int.from_bytes(lower, "big") - upperBits).to_bytes(40, "big").decode()
+    )
+
+
+def artifact_file_name(jsonFileName):
+    return jsonFileName[: -len(".json")] + ".bin.zst"
+
+
+def content_hash(data):
+    return encode_hex(keccak(data))
+
+
+def encode_rewards_artifact(distribution, tree):
+    """
+    Encode a distribution without proofs and its merkle tree, as returned by build_merkle_distribution
+    """
+    header = {
+        key: value for key, value in distribution.items() if key not in ("claims",)
+    }
+    headerBytes = json.dumps(header).encode()
+    cycle = int(distribution["cycle"])
+
+    tokens = sorted(
+        {
+            token
+            for claim in distribution["claims"].values()
+            for token in claim["tokens"]
+        }
+    )
+    tokenIds = {token: tokenId for tokenId, token in enumerate(tokens)}
+
+    parts = [magic, struct.pack("<BI", version, len(headerBytes)), headerBytes]
+    parts.append(struct.pack("<H", len(tokens)))
+    parts.extend(bytes.fromhex(token[2:]) for token in tokens)
+
+    parts.append(struct.pack("<I", len(distribution["claims"])))
+    for user, claim in distribution["claims"].items():
+        assert int(claim["cycle"], 16) == cycle
+        parts.append(bytes.fromhex(user[2:]))
+        parts.append(
+            struct.pack(
+                "<QIB",
+                int(claim["index"], 16),
+                tree.get_position(claim["node"]),
+                len(claim["tokens"]),
+            )
+        )
+        for token, amount in zip(claim["tokens"], claim["cumulativeAmounts"]):
+            parts.append(struct.pack("<H", tokenIds[token]))
+            parts.append(int(amount).to_bytes(32, "big"))
+
+    parts.append(struct.pack("<B", len(tree.layers)))
+    for layer in tree.layers:
+        parts.append(struct.pack("<I", len(layer) // nodeSize))
+        parts.append(bytes(layer))
+
+    return zstandard.ZstdCompressor(level=compressionLevel).compress(b"".join(parts))
+
+
+def write_rewards_artifact(fileName, distribution, tree):
+    """
+    Returns the artifact's content hash
+    """
+    data = encode_rewards_artifact(distribution, tree)
+    with open(fileName, "wb") as f:
+        f.write(data)
+    return content_hash(data)
+
+
+def decode_rewards_artifact(data, withProofs=False, verify=True):
+    """
+    Decode to the same dict as load_rewards_file, claims have proofs only if withProofs
+    With verify, claims get their node and must rebuild exactly the stored tree, otherwise only the stored root is checked
+    """
+    raw = memoryview(zstandard.ZstdDecompressor().decompress(data))
+    if raw[:4] != magic:
+        raise ValueError("Not a rewards artifact")
+    (fileVersion, headerLength) = struct.unpack_from("<BI", raw, 4)
+    if fileVersion != version:
+        raise ValueError("Unsupported rewards artifact version {}".format(fileVersion))
+    offset = 9
+    rewards = json.loads(bytes(raw[offset : offset + headerLength]))
+    offset += headerLength
+
+    (numTokens,) = struct.unpack_from("<H", raw, offset)
+    offset += 2
+    tokens = [
+        checksum_address(bytes(raw[offset + i * 20 : offset + (i + 1) * 20]))
+        for i in range(numTokens)
+    ]
+    offset += numTokens * 20
+
+    (numClaims,) = struct.unpack_from("<I", raw, offset)
+    offset += 4
+    cycle = hex(rewards["cycle"])
+    claims = []
+    for i in range(numClaims):
+        user = checksum_address(bytes(raw[offset : offset + 20]))
+        (index, position, numUserTokens) = struct.unpack_from("<QIB", raw, offset + 20)
+        offset += 33
+        userTokens = []
+        amounts = []
+        for j in range(numUserTokens):
+            (tokenId,) = struct.unpack_from("<H", raw, offset)
+            userTokens.append(tokens[tokenId])
+            amounts.append(str(int.from_bytes(raw[offset + 2 : offset + 34], "big")))
+            offset += 34
+        claims.append(
+            (
+                user,
+                position,
+                {
+                    "index": hex(index),
+                    "user": user,
+                    "cycle": cycle,
+                    "tokens": userTokens,
+                    "cumulativeAmounts": amounts,
+                },
+            )
+        )
+
+    (numLayers,) = struct.unpack_from("<B", raw, offset)
+    offset += 1
+    layers = []
+    for i in range(numLayers):
+        (numNodes,) = struct.unpack_from("<I", raw, offset)
+        offset += 4
+        layers.append(raw[offset : offset + numNodes * nodeSize])
+        offset += numNodes * nodeSize
+
+    if encode_hex(bytes(layers[-1][:nodeSize])) != rewards["merkleRoot"]:
+        raise ValueError("Rewards artifact tree doesn't match its merkle root")
+
+    nodes = {}
+    if verify:
+        leaves = []
+        for user, position, claim in claims:
+            encoded = encode_claim(
+                claim["tokens"],
+                claim["cumulativeAmounts"],
+                index=int(claim["index"], 16),
+                cycle=rewards["cycle"],
+                account=user,
+            )
+            leaf = keccak(encoded)
+            if layers[0][position * nodeSize : (position + 1) * nodeSize] != leaf:
+                raise ValueError(
+                    "Rewards artifact claim for {} isn't in its tree".format(user)
+                )
+            leaves.append(leaf)
+            nodes[user] = encode_hex(encoded)
+        rebuilt = MerkleTree.from_leaf_hashes(leaves)
+        if [bytes(layer) for layer in rebuilt.layers] != [
+            bytes(layer) for layer in layers
+        ]:
+            raise ValueError("Rewards artifact tree doesn't match its claims")
+
+    rewards["claims"] = {}
+    for user, position, claim in claims:
+        if withProofs:
+            claim["proof"] = proof_from_layers(layers, position)
+        if verify:
+            claim["node"] = nodes[user]
+        rewards["claims"][user] = claim
+    return rewards
+
+
+def proof_from_layers(layers, idx):
+    proof = []
+    for layer in layers:
+        pairStart = (idx ^ 1) * nodeSize
+        if pairStart < len(layer):
+            proof.append("0x" + layer[pairStart : pairStart + nodeSize].hex())
+        idx //= 2
+    return proof
+
+
+def load_rewards_artifact(fileName, withProofs=False, expectedHash=None, verify=True):
+    with open(fileName, "rb") as f:
+        data = f.read()
+    if expectedHash and content_hash(data) != expectedHash:
+        raise ValueError("Rewards artifact {} failed its content hash".format(fileName))
+    return decode_rewards_artifact(data, withProofs, verify)
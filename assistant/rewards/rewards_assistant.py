@@ -1,8 +1,41 @@
 import json
-
-from assistant.rewards.calc_stakes import calc_geyser_stakes
-from assistant.rewards.merkle_tree import rewards_to_merkle_tree
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from assistant.rewards.calc_stakes import (
+    compute_geyser_rewards,
+    get_replay_start,
+    get_unlock_schedules,
+    prepare_geyser_inputs,
+    sync_geyser_events,
+)
+from assistant.rewards.block_cache import get_block_cache
+from assistant.rewards.claim_index import ClaimIndex, IndexedClaims, build_claim_index
+from assistant.rewards.config import rewards_config
+from assistant.rewards.geyser_checkpoints import canonical_hash
+from assistant.rewards.merkle_tree import (
+    build_merkle_distribution,
+    iter_claims_with_proofs,
+)
+from assistant.rewards.rewards_attribution import (
+    attribution_file_name,
+    write_attribution_file,
+)
+from assistant.rewards.rewards_artifact import (
+    artifact_file_name,
+    load_rewards_artifact,
+    write_rewards_artifact,
+)
+from assistant.rewards.rewards_file import (
+    load_rewards_file,
+    read_header,
+    write_rewards_file,
+)
+from assistant.rewards.rewards_ledger import address_key, merge_cumulative
+from assistant.rewards.rewards_shards import shard_directory, write_rewards_shards
 from assistant.rewards.rewards_checker import compare_rewards
+from assistant.rewards.stage_cache import get_stage_cache, stage_key
 from assistant.rewards.RewardsList import RewardsList
 from brownie import *
 from helpers.time_utils import hours
@@ -17,7 +50,6 @@ def sum_rewards(sources, cycle, badgerTree):
     Sum rewards from all given set of rewards' list, returning a single rewards list
     """
     totals = RewardsList(cycle, badgerTree)
-    total = 0
     # For each rewards list entry
     for key, rewardsSet in sources.items():
         # Get the claims data
@@ -25,33 +57,99 @@ def sum_rewards(sources, cycle, badgerTree):
         metadata = rewardsSet["metadata"]
 
         # Add values from each user
-        for user, userData in claims.items():
+        for user in claims:
             totals.track_user_metadata(user, metadata)
-
-            # For each token
-            for token, tokenAmount in userData.items():
-                totals.increase_user_rewards(user, token, tokenAmount)
-
-                total += tokenAmount
-    totals.badgerSum = total
+        totals.add_source_claims(key, claims, metadata)
+    totals.badgerSum = sum(totals.ledger.totals)
     # totals.printState()
     return totals
 
 
-def calc_geyser_rewards(badger, periodStartBlock, endBlock, cycle):
+def calc_geyser_rewards(badger, periodStartBlock, endBlock, cycle, cache=None):
     """
     Calculate rewards for each geyser, and sum them
     userRewards = (userShareSeconds / totalShareSeconds) / tokensReleased
     (For each token, for the time period)
+    With a stage cache, geysers already computed for the same inputs are loaded instead
     """
+    # Key each geyser's result by its block range and hashes, address and unlock schedules
+    geyserKeys = {}
     rewardsByGeyser = {}
+    if cache:
+        blocks = get_block_cache().get_blocks([periodStartBlock, endBlock])
+        for key, geyser in badger.geysers.items():
+            geyserKeys[key] = stage_key(
+                "geyser",
+                {
+                    "key": key,
+                    "geyser": str(geyser.address),
+                    "startBlock": periodStartBlock,
+                    "endBlock": endBlock,
+                    "startBlockHash": blocks[periodStartBlock]["hash"],
+                    "endBlockHash": blocks[endBlock]["hash"],
+                    "unlockSchedules": get_unlock_schedules(geyser),
+                    "shareSecondsEngine": rewards_config.shareSecondsEngine,
+                },
+            )
+            cached = cache.load("geyser", geyserKeys[key])
+            if cached is not None:
+                rewardsByGeyser[key] = cached
+
+    pending = {
+        key: geyser
+        for key, geyser in badger.geysers.items()
+        if key not in rewardsByGeyser
+    }
+    if pending:
+        rewardsByGeyser.update(compute_geysers(pending, periodStartBlock, endBlock))
+    # Ranges ending within eventStoreConfirmations of the head could still be reorged, so aren't saved
+    if cache and endBlock <= chain.height - rewards_config.eventStoreConfirmations:
+        for key in pending:
+            cache.save("geyser", geyserKeys[key], rewardsByGeyser[key])
+
+    totals = sum_rewards(
+        {key: rewardsByGeyser[key] for key in badger.geysers}, cycle, badger.badgerTree
+    )
+    # Identifies these rewards in the keys of later stages
+    totals.inputsHash = canonical_hash(geyserKeys) if cache else None
+    return totals
+
+
+def compute_geysers(geysers, periodStartBlock, endBlock):
+    """
+    Rewards for each of {key: geyser}, as plain data
+    """
+    # Fetch events for all geysers in one pass, back to the earliest checkpoint needed
+    replayFrom = min(
+        get_replay_start(geyser, periodStartBlock) for geyser in geysers.values()
+    )
+    eventsByGeyser = sync_geyser_events(list(geysers.values()), replayFrom, endBlock)
+
+    # Gather inputs for each geyser, everything after this is local computation
+    inputsByGeyser = {}
+    for key, geyser in geysers.items():
+        inputsByGeyser[key] = prepare_geyser_inputs(
+            key,
+            geyser,
+            periodStartBlock,
+            endBlock,
+            eventsByGeyser[geyser.address],
+            replayFrom,
+        )
 
     # For each Geyser, get a list of user to weights
-    for key, geyser in badger.geysers.items():
-        geyserRewards = calc_geyser_stakes(key, geyser, periodStartBlock, endBlock)
-        rewardsByGeyser[key] = geyserRewards
+    if rewards_config.geyserWorkers > 1:
+        with ProcessPoolExecutor(
+            max_workers=rewards_config.geyserWorkers,
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            results = executor.map(compute_geyser_rewards, inputsByGeyser.values())
+            return dict(zip(inputsByGeyser.keys(), results))
 
-    return sum_rewards(rewardsByGeyser, cycle, badger.badgerTree)
+    rewardsByGeyser = {}
+    for key, inputs in inputsByGeyser.items():
+        rewardsByGeyser[key] = compute_geyser_rewards(inputs)
+    return rewardsByGeyser
 
 
 def calc_harvest_meta_farm_rewards(badger, startBlock, endBlock):
@@ -60,20 +158,23 @@ def calc_harvest_meta_farm_rewards(badger, startBlock, endBlock):
 
 
 def process_cumulative_rewards(current, new: RewardsList):
+    """
+    Merge join the previous tree's claims, streamed in address order, with the new rewards
+    """
     result = RewardsList(new.cycle, new.badgerTree)
 
-    # Add new rewards
-    for user, claims in new.claims.items():
-        for token, claim in claims.items():
-            result.increase_user_rewards(user, token, claim)
+    previousClaims = current["claims"]
+    if isinstance(previousClaims, IndexedClaims):
+        previousItems = previousClaims.items()
+    else:
+        previousItems = sorted(
+            previousClaims.items(), key=lambda item: address_key(item[0])
+        )
 
-    # Add existing rewards
-    for user, userData in current["claims"].items():
-        for i in range(len(userData["tokens"])):
-            token = userData["tokens"][i]
-            amount = userData["cumulativeAmounts"][i]
-            # print(user, token, amount)
-            result.increase_user_rewards(user, token, int(amount))
+    (ledger, result.previousIndices, result.previousAmounts) = merge_cumulative(
+        previousItems, new.ledger, current.get("tokenTotals", {}).keys()
+    )
+    result.load_ledger(ledger)
 
     # result.printState()
     return result
@@ -81,21 +182,155 @@ def process_cumulative_rewards(current, new: RewardsList):
 
 def combine_rewards(list, cycle, badgerTree):
     totals = RewardsList(cycle, badgerTree)
-    total = 0
     # For each rewards list entry
     for key, rewardsSet in list.items():
-        # Get the claims data
-        # claims = rewardsSet["claims"]
-        for user, userData in rewardsSet.claims.items():
-            # For each token
-            for token, tokenAmount in userData.items():
-                totals.increase_user_rewards(user, token, tokenAmount)
-                total += tokenAmount
-    totals.badgerSum = total
+        totals.add_rewards(rewardsSet)
+    totals.badgerSum = sum(totals.ledger.totals)
     # totals.printState()
     return totals
 
 
+class CycleComputation:
+    """
+    One cycle's stages over a block range, each computed once and kept for the rest of the process
+    Keyed by (startBlock, endBlock, cycle, prior content hash), so the root updater and guardian share results
+    With a stage cache, results are also loaded from and saved to disk under a hash of their inputs
+    """
+
+    def __init__(
+        self, badger, startBlock, endBlock, cycle, currentMerkleData, cache=None
+    ):
+        self.badger = badger
+        self.startBlock = startBlock
+        self.endBlock = endBlock
+        self.cycle = cycle
+        self.currentMerkleData = currentMerkleData
+        self.cache = cache
+        self.key = (startBlock, endBlock, cycle, currentMerkleData["contentHash"])
+        self.results = {}
+
+    def stage(self, name, compute, cacheKey=None):
+        if name in self.results:
+            console.print(
+                "[green]Reusing {} for cycle {}[/green]".format(name, self.cycle)
+            )
+        elif self.cache and cacheKey:
+            self.results[name] = self.cache.get(name, cacheKey, compute)
+        else:
+            self.results[name] = compute()
+        return self.results[name]
+
+    def current_rewards(self):
+        return self.stage(
+            "currentRewards", lambda: fetch_current_rewards_tree(self.badger)
+        )
+
+    def geyser_rewards(self):
+        return self.stage(
+            "geyserRewards",
+            lambda: calc_geyser_rewards(
+                self.badger, self.startBlock, self.endBlock, self.cycle, self.cache
+            ),
+        )
+
+    def cumulative_key(self):
+        return stage_key(
+            "cumulativeLedger",
+            {
+                "priorRoot": self.currentMerkleData["root"],
+                "newRewards": self.geyser_rewards().inputsHash,
+                "cycle": self.cycle,
+            },
+        )
+
+    def cumulative_rewards(self):
+        def compute():
+            rewards = process_cumulative_rewards(
+                self.current_rewards(), self.geyser_rewards()
+            )
+            return (rewards.ledger, rewards.previousIndices, rewards.previousAmounts)
+
+        (ledger, previousIndices, previousAmounts) = self.stage(
+            "cumulativeLedger", compute, self.cumulative_key() if self.cache else None
+        )
+        rewards = RewardsList(self.cycle, self.badger.badgerTree)
+        rewards.load_ledger(ledger)
+        rewards.previousIndices = previousIndices
+        rewards.previousAmounts = previousAmounts
+        return rewards
+
+    def merkle_distribution(self, recompute=False):
+        """
+        (distribution, tree) as returned by build_merkle_distribution
+        With recompute, the tree is rebuilt from the cumulative ledger and not stored or taken from the stage cache
+        """
+
+        def compute():
+            return build_merkle_distribution(
+                self.cumulative_rewards(),
+                self.startBlock,
+                self.endBlock,
+                self.geyser_rewards(),
+                self.current_rewards(),
+            )
+
+        if recompute:
+            return compute()
+        cacheKey = None
+        if self.cache:
+            cacheKey = stage_key(
+                "merkleDistribution",
+                {
+                    "cumulative": self.cumulative_key(),
+                    "startBlock": self.startBlock,
+                    "endBlock": self.endBlock,
+                },
+            )
+        return self.stage("merkleDistribution", compute, cacheKey)
+
+    def close(self):
+        """
+        Release the previous tree's claim index, if it was loaded
+        """
+        if "currentRewards" in self.results:
+            close_rewards_tree(self.results["currentRewards"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # Shared computations stay open for the next role, and are closed when replaced
+        if cycleComputations.get(self.key) is not self:
+            self.close()
+
+
+# The latest cycle's computation, replaced when a different cycle is computed
+cycleComputations = {}
+
+
+def get_cycle_computation(badger, startBlock, endBlock, strict=False):
+    """
+    The computation for this block range against the current root, shared within the process unless strict
+    A strict computation also ignores the stage cache
+    """
+    computation = CycleComputation(
+        badger,
+        startBlock,
+        endBlock,
+        getNextCycle(badger),
+        fetchCurrentMerkleData(badger),
+        None if strict else get_stage_cache(),
+    )
+    if strict:
+        return computation
+    if computation.key not in cycleComputations:
+        for replaced in cycleComputations.values():
+            replaced.close()
+        cycleComputations.clear()
+        cycleComputations[computation.key] = computation
+    return cycleComputations[computation.key]
+
+
 def guardian(badger, startBlock, endBlock, test=True):
     """
     Guardian Role
@@ -109,8 +344,6 @@ def guardian(badger, startBlock, endBlock, test=True):
     print("Guardian", startBlock, endBlock)
 
     badgerTree = badger.badgerTree
-    guardian = badger.guardian
-    nextCycle = getNextCycle(badger)
 
     console.print("\n[bold cyan]===== Guardian =====[/bold cyan]\n")
 
@@ -120,24 +353,39 @@ def guardian(badger, startBlock, endBlock, test=True):
 
     pendingMerkleData = badgerTree.getPendingMerkleData()
 
-    currentMerkleData = fetchCurrentMerkleData(badger)
-    currentRewards = fetch_current_rewards_tree(badger)
-    currentContentHash = currentMerkleData["contentHash"]
+    if not rewards_config.guardianStrictRecompute:
+        console.print(
+            "[bold red]===== guardianStrictRecompute is off: verifying against the root updater's stages, only the merkle tree is rebuilt =====[/bold red]"
+        )
+
+    with get_cycle_computation(
+        badger, startBlock, endBlock, strict=rewards_config.guardianStrictRecompute
+    ) as computation:
+        return verify_pending_root(
+            badger, computation, pendingMerkleData, startBlock, endBlock, test
+        )
+
+
+def verify_pending_root(
+    badger, computation, pendingMerkleData, startBlock, endBlock, test
+):
+    """
+    Recompute the cycle, or reuse its stages up to the cumulative ledger, and approve the pending root if it matches
+    The merkle tree is always rebuilt, never taken from the proposer's result
+    """
+    badgerTree = badger.badgerTree
+    guardian = badger.guardian
+    nextCycle = computation.cycle
+    currentContentHash = computation.currentMerkleData["contentHash"]
     # blockNumber = currentMerkleData["blockNumber"]
 
     console.print("\n[bold cyan]===== Verifying Rewards =====[/bold cyan]\n")
     print("Geyser Rewards", startBlock, endBlock, nextCycle)
-    geyserRewards = calc_geyser_rewards(badger, startBlock, endBlock, nextCycle)
-
-    newRewards = geyserRewards
-
-    cumulativeRewards = process_cumulative_rewards(currentRewards, newRewards)
+    geyserRewards = computation.geyser_rewards()
 
     # Take metadata from geyserRewards
     console.print("Processing to merkle tree")
-    merkleTree = rewards_to_merkle_tree(
-        cumulativeRewards, startBlock, endBlock, geyserRewards
-    )
+    (merkleTree, tree) = computation.merkle_distribution(recompute=True)
 
     # ===== Re-Publish data for redundancy ======
     rootHash = hash(merkleTree["merkleRoot"])
@@ -160,26 +408,61 @@ def guardian(badger, startBlock, endBlock, test=True):
     print("Uploading to file " + contentFileName)
 
     # TODO: Upload file to AWS & serve from server
-    with open(contentFileName, "w") as outfile:
-        json.dump(merkleTree, outfile)
-    # upload(contentFileName)
-
-    with open(contentFileName) as f:
-        after_file = json.load(f)
+    fileNames = write_rewards_files(contentFileName, merkleTree, tree, geyserRewards)
 
     compare_rewards(
-        badger, startBlock, endBlock, currentRewards, after_file, currentContentHash
+        badger,
+        startBlock,
+        endBlock,
+        computation.cumulative_rewards().previousAmounts,
+        merkleTree,
+        currentContentHash,
     )
 
     console.print("===== Guardian Complete =====")
 
     if not test:
-        upload(contentFileName),
+        for fileName in fileNames:
+            upload(fileName)
         badgerTree.approveRoot(
             merkleTree["merkleRoot"], rootHash, merkleTree["cycle"], {"from": guardian}
         )
 
 
+def write_rewards_files(contentFileName, merkleTree, tree, newRewards=None):
+    """
+    Write the JSON rewards file and, if enabled, its claim index, the binary artifact, shards and the attribution of newRewards next to it
+    Returns the files to upload
+    """
+    write_rewards_file(
+        contentFileName, merkleTree, iter_claims_with_proofs(merkleTree, tree)
+    )
+    fileNames = [contentFileName]
+
+    if rewards_config.rewardsIndex:
+        fileNames.append(build_claim_index(contentFileName))
+
+    if rewards_config.rewardsArtifact:
+        artifactFile = artifact_file_name(contentFileName)
+        artifactHash = write_rewards_artifact(artifactFile, merkleTree, tree)
+        console.log({"artifactFile": artifactFile, "artifactHash": artifactHash})
+        fileNames.append(artifactFile)
+
+    if rewards_config.rewardsShards:
+        fileNames.extend(
+            write_rewards_shards(shard_directory(contentFileName), merkleTree, tree)
+        )
+
+    if rewards_config.rewardsAttribution and newRewards:
+        fileNames.extend(
+            write_attribution_file(
+                attribution_file_name(contentFileName), merkleTree, newRewards
+            )
+        )
+
+    return fileNames
+
+
 def fetchCurrentMerkleData(badger):
     currentMerkleData = badger.badgerTree.getCurrentMerkleData()
     root = str(currentMerkleData[0])
@@ -204,6 +487,12 @@ def hash(value):
 
 
 def fetch_current_rewards_tree(badger):
+    """
+    Load the published tree for the current root
+    The JSON rewards file is the primary format: with streamPreviousTree its claims stay on disk behind its claim index
+    and must be released with close_rewards_tree, otherwise they're loaded without proofs
+    Without the JSON file the binary artifact is loaded, rebuilt and checked against its root, which is checked against the chain below
+    """
     # TODO Files should be hashed and signed by keeper to prevent tampering
     # TODO How will we upload addresses securely?
     # We will check signature before posting
@@ -214,8 +503,18 @@ def fetch_current_rewards_tree(badger):
         "[bold yellow]===== Loading Past Rewards " + pastFile + " =====[/bold yellow]"
     )
 
-    with open(pastFile) as f:
-        currentTree = json.load(f)
+    artifactFile = artifact_file_name(pastFile)
+    if os.path.isfile(pastFile) and rewards_config.streamPreviousTree:
+        # Claims stay on disk, read in address order or looked up through the claim index
+        currentTree = read_header(pastFile)
+        currentTree["claims"] = IndexedClaims(ClaimIndex(pastFile))
+    elif os.path.isfile(pastFile):
+        currentTree = load_rewards_file(pastFile)
+    elif os.path.isfile(artifactFile):
+        console.print("[yellow]No rewards file, loading " + artifactFile + "[/yellow]")
+        currentTree = load_rewards_artifact(artifactFile)
+    else:
+        raise FileNotFoundError(pastFile)
 
     # Invariant: File shoulld have same root as latest
     assert currentTree["merkleRoot"] == merkle["root"]
@@ -232,6 +531,14 @@ def fetch_current_rewards_tree(badger):
     return currentTree
 
 
+def close_rewards_tree(tree):
+    """
+    Release the claim index behind a tree from fetch_current_rewards_tree
+    """
+    if isinstance(tree["claims"], IndexedClaims):
+        tree["claims"].claimIndex.close()
+
+
 def rootUpdater(badger, startBlock, endBlock, test=True):
     """
     Root Updater Role
@@ -241,15 +548,22 @@ def rootUpdater(badger, startBlock, endBlock, test=True):
 
     (In case of a one-off failure, Script will be attempted again at the rootUpdaterInterval)
     """
-    badgerTree = badger.badgerTree
     keeper = badger.keeper
-    nextCycle = getNextCycle(badger)
 
     assert keeper == badger.keeper
 
     console.print("\n[bold cyan]===== Root Updater =====[/bold cyan]\n")
-    currentMerkleData = fetchCurrentMerkleData(badger)
-    currentRewards = fetch_current_rewards_tree(badger)
+    with get_cycle_computation(badger, startBlock, endBlock) as computation:
+        return propose_root(badger, computation, startBlock, endBlock, test)
+
+
+def propose_root(badger, computation, startBlock, endBlock, test):
+    """
+    Compute the cycle and propose its root, unless the last update is too recent or a root is pending
+    """
+    badgerTree = badger.badgerTree
+    nextCycle = computation.cycle
+    currentMerkleData = computation.currentMerkleData
 
     currentTime = chain.time()
 
@@ -267,17 +581,12 @@ def rootUpdater(badger, startBlock, endBlock, test=True):
         return False
     print("Geyser Rewards", startBlock, endBlock, nextCycle)
 
-    geyserRewards = calc_geyser_rewards(badger, startBlock, endBlock, nextCycle)
+    geyserRewards = computation.geyser_rewards()
     # metaFarmRewards = calc_harvest_meta_farm_rewards(badger, startBlock, endBlock)
-    newRewards = geyserRewards
-
-    cumulativeRewards = process_cumulative_rewards(currentRewards, newRewards)
 
     # Take metadata from geyserRewards
     console.print("Processing to merkle tree")
-    merkleTree = rewards_to_merkle_tree(
-        cumulativeRewards, startBlock, endBlock, geyserRewards
-    )
+    (merkleTree, tree) = computation.merkle_distribution()
 
     # Publish data
     rootHash = hash(merkleTree["merkleRoot"])
@@ -296,23 +605,20 @@ def rootUpdater(badger, startBlock, endBlock, test=True):
 
     print("Uploading to file " + contentFileName)
     # TODO: Upload file to AWS & serve from server
-    with open(contentFileName, "w") as outfile:
-        json.dump(merkleTree, outfile)
-
-    with open(contentFileName) as f:
-        after_file = json.load(f)
+    fileNames = write_rewards_files(contentFileName, merkleTree, tree, geyserRewards)
 
     compare_rewards(
         badger,
         startBlock,
         endBlock,
-        currentRewards,
-        after_file,
+        computation.cumulative_rewards().previousAmounts,
+        merkleTree,
         currentMerkleData["contentHash"],
     )
     console.print("===== Root Updater Complete =====")
     if not test:
-        upload(contentFileName)
+        for fileName in fileNames:
+            upload(fileName)
         badgerTree.proposeRoot(merkleTree["merkleRoot"], rootHash, merkleTree["cycle"])
 
     return True
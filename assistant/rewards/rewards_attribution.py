@@ -0,0 +1,76 @@
+from assistant.rewards.claim_index import ClaimIndex, build_claim_index
+from assistant.rewards.rewards_file import write_rewards_file
+from assistant.rewards.rewards_ledger import address_key
+
+"""
+This cycle's rewards by source (geyser key) for each user, published next to the rewards file with its own claim index
+
+rewards-<chain>-<hash>.attribution.json has the layout of a rewards file, so it's indexed and read the same way:
+    merkleRoot, cycle, startBlock, endBlock, sources, sourceTotals
+    claims: {user: {user, sources: {source: {tokens: {token: amount}, shareSeconds, shareSecondsInRange}}}}
+A user's amounts summed over sources are how much their cumulative claim grew this cycle
+"""
+
+
+def attribution_file_name(contentFileName):
+    return contentFileName[: -len(".json")] + ".attribution.json"
+
+
+def user_attribution(rewards, user):
+    """
+    A user's amounts and share seconds from each source they earned from
+    """
+    sources = {}
+    for source, ledger in rewards.sources.items():
+        userId = ledger.userIds.get(user)
+        if userId is None:
+            continue
+        (tokens, amounts) = ledger.user_amounts(userId)
+        entry = {
+            "tokens": {token: str(amount) for token, amount in zip(tokens, amounts)}
+        }
+        metadata = rewards.sourceMetadata.get(source, {}).get(user)
+        if metadata:
+            entry["shareSeconds"] = int(metadata["shareSeconds"])
+            entry["shareSecondsInRange"] = int(metadata["shareSecondsInRange"])
+        sources[source] = entry
+    return {"user": user, "sources": sources}
+
+
+def iter_attribution(rewards):
+    """
+    Yield (user, attribution) for every user with new rewards, in address order
+    """
+    for user in sorted(rewards.ledger.users, key=address_key):
+        yield (user, user_attribution(rewards, user))
+
+
+def write_attribution_file(fileName, merkleTree, rewards):
+    """
+    Write the attribution of a cycle's new rewards and its claim index
+    Returns the files written
+    """
+    header = {
+        "merkleRoot": merkleTree["merkleRoot"],
+        "cycle": merkleTree["cycle"],
+        "startBlock": merkleTree["startBlock"],
+        "endBlock": merkleTree["endBlock"],
+        "sources": list(rewards.sources),
+        "sourceTotals": {
+            source: {
+                token: str(total) for token, total in ledger.token_totals().items()
+            }
+            for source, ledger in rewards.sources.items()
+        },
+        "claims": None,
+    }
+    write_rewards_file(fileName, header, iter_attribution(rewards))
+    return [fileName, build_claim_index(fileName)]
+
+
+def lookup_attribution(fileName, user):
+    """
+    A user's attribution for the cycle, or None if they earned nothing in it
+    """
+    with ClaimIndex(fileName) as attribution:
+        return attribution.get_claim(user)
@@ -1,5 +1,8 @@
 from tabulate import tabulate
 from assistant.rewards.BadgerGeyserMock import BadgerGeyserMock
+from assistant.rewards.block_cache import get_block_cache
+from assistant.rewards.claim_index import ClaimIndex
+from assistant.rewards.rewards_file import load_rewards_file
 from scripts.systems.badger_system import BadgerSystem
 from brownie import *
 from rich.console import Console
@@ -20,8 +23,9 @@ def sec(amount):
 
 
 def get_distributed_in_range(key, geyser, startBlock, endBlock):
-    periodEndTime = web3.eth.getBlock(endBlock)["timestamp"]
-    periodStartTime = web3.eth.getBlock(startBlock)["timestamp"]
+    blocks = get_block_cache().get_blocks([startBlock, endBlock])
+    periodEndTime = blocks[endBlock]["timestamp"]
+    periodStartTime = blocks[startBlock]["timestamp"]
 
     geyserMock = BadgerGeyserMock(key)
     distributionTokens = geyser.getDistributionTokens()
@@ -66,17 +70,20 @@ def compare_rewards(
     badger: BadgerSystem,
     startBlock,
     endBlock,
-    before_file,
+    beforeAmounts,
     after_file,
     beforeContentHash,
 ):
+    """
+    beforeAmounts is each previous user's first cumulative amount, as recorded by the merge with the previous tree
+    """
     # Get these from files based on past root
     with open("rewards-1-" + "og" + ".json") as f:
         ec_file = json.load(f)
 
-    before = before_file["claims"]
+    before = beforeAmounts
     after = after_file["claims"]
-    ec = before_file["claims"]
+    ec = beforeAmounts
 
     metadata = after_file["metadata"]
 
@@ -94,8 +101,9 @@ def compare_rewards(
         0
     ].amount
 
-    periodStartTime = web3.eth.getBlock(startBlock)["timestamp"]
-    periodEndTime = web3.eth.getBlock(endBlock)["timestamp"]
+    blocks = get_block_cache().get_blocks([startBlock, endBlock])
+    periodStartTime = blocks[startBlock]["timestamp"]
+    periodEndTime = blocks[endBlock]["timestamp"]
 
     duration = periodEndTime - periodStartTime
     expectedInRange = totalExpected * duration // days(7)
@@ -113,7 +121,7 @@ def compare_rewards(
     expectedGains = getExpectedDistributionInRange(badger, startBlock, endBlock)
 
     # Total claims must only increase
-    sum_before = sum_claims(before)
+    sum_before = sum(before.values())
     sum_after = sum_claims(after)
     sanitySum = Wei("600000 ether")
 
@@ -160,9 +168,9 @@ def compare_rewards(
         beforeClaim = 0
         ecClaim = 0
         if user in before:
-            beforeClaim = int(before[user]["cumulativeAmounts"][0])
+            beforeClaim = before[user]
         if user in ec:
-            ecClaim = int(ec[user]["cumulativeAmounts"][0])
+            ecClaim = ec[user]
         diff = afterClaim - beforeClaim
 
         # print([user, val(beforeClaim), val(afterClaim), val(diff)])
@@ -221,12 +229,10 @@ def compare_rewards(
 
 
 def push_rewards(badger: BadgerSystem, afterContentHash):
-    with open("rewards-1-" + afterContentHash + ".json") as f:
-        after_file = json.load(f)
+    after_file = load_rewards_file("rewards-1-" + afterContentHash + ".json")
 
     keeper = badger.keeper
 
-    claims = after_file["claims"]
     upload("rewards-1-" + afterContentHash + ".json")
     badger.badgerTree.proposeRoot(
         after_file["merkleRoot"],
@@ -242,9 +248,9 @@ def push_rewards(badger: BadgerSystem, afterContentHash):
     ),
 
 
-def test_claims(badger: BadgerSystem, startBlock, endBlock, before_file, after_file):
+def test_claims(badger: BadgerSystem, startBlock, endBlock, before_file, afterFileName):
     before = before_file["claims"]
-    claims = after_file["claims"]
+    claims = ClaimIndex(afterFileName)
 
     # Total claims must only increase
     total_claimable = sum_claims(claims)
@@ -0,0 +1,165 @@
+import json
+
+"""
+Streaming reads and writes of rewards-<chain>-<hash>.json files, so no cycle holds every claim and proof as one document
+
+Files are written with the same layout as json.dump of the distribution dict
+Reads walk the top level object and yield claims one at a time
+"""
+
+chunkSize = 1 << 20
+decoder = json.JSONDecoder()
+
+
+def write_rewards_file(fileName, distribution, claims):
+    """
+    Write distribution with its claims replaced by an iterable of (user, claim), consumed as it's written
+    """
+    with open(fileName, "w") as f:
+        f.write("{")
+        first = True
+        for key, value in distribution.items():
+            if not first:
+                f.write(", ")
+            first = False
+            f.write(json.dumps(key) + ": ")
+            if key != "claims":
+                f.write(json.dumps(value))
+                continue
+
+            f.write("{")
+            firstClaim = True
+            for user, claim in claims:
+                if not firstClaim:
+                    f.write(", ")
+                firstClaim = False
+                f.write(json.dumps(user) + ": " + json.dumps(claim))
+            f.write("}")
+        f.write("}")
+
+
+class JsonStream:
+    """
+    Incremental reader over a JSON file, decoding one value at a time from a bounded buffer
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        # Characters dropped from the front of the buffer, so consumed + pos is the offset in the file
+        self.consumed = 0
+
+    def fill(self):
+        chunk = self.f.read(chunkSize)
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(
+                "Expected {} at {!r}".format(
+                    char, self.buffer[self.pos : self.pos + 20]
+                )
+            )
+        self.pos += 1
+
+    def offset(self):
+        return self.consumed + self.pos
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                (value, end) = decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def items(self):
+        """
+        Keys of the object at the current position, with the stream positioned at each key's value
+        The caller must read each value before advancing
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def iter_rewards_file(fileName, streamed=("claims", "metadata")):
+    """
+    Yield (key, value) for each top level field, streamed fields yield (key, (member, value)) for each member
+    """
+    with open(fileName) as f:
+        stream = JsonStream(f)
+        for key in stream.items():
+            if key not in streamed:
+                yield (key, stream.value())
+                continue
+            for member in stream.items():
+                yield (key, (member, stream.value()))
+
+
+def iter_claims(fileName):
+    """
+    Yield (user, claim) for each claim in a rewards file
+    """
+    for key, value in iter_rewards_file(fileName, streamed=("claims",)):
+        if key == "claims":
+            yield value
+
+
+def read_header(rewardsFile):
+    """
+    Top level fields before claims, without reading any claims
+    """
+    header = {}
+    for key, value in iter_rewards_file(rewardsFile):
+        if key in ("claims", "metadata"):
+            break
+        header[key] = value
+    return header
+
+
+def load_rewards_file(fileName, withProofs=False):
+    """
+    Load a rewards file one claim at a time, dropping proofs unless withProofs
+    """
+    rewards = {"claims": {}, "metadata": {}}
+    for key, value in iter_rewards_file(fileName):
+        if key not in ("claims", "metadata"):
+            rewards[key] = value
+            continue
+        (member, memberValue) = value
+        if key == "claims" and not withProofs:
+            memberValue.pop("proof", None)
+        rewards[key][member] = memberValue
+    return rewards
@@ -0,0 +1,221 @@
+from collections.abc import Mapping
+
+"""
+Cumulative rewards as columns: users and tokens are interned to indices, and each token has one column of amounts by user
+
+A column holds None where the user has no entry for the token, so explicit zero amounts are kept
+Merging another ledger maps its indices once and adds column by column, totals are kept per column as amounts are added
+A user's tokens are listed in ledger token order
+"""
+
+
+class RewardsLedger:
+    def __init__(self):
+        self.users = []
+        self.userIds = {}
+        self.tokens = []
+        self.tokenIds = {}
+        self.columns = []
+        self.totals = []
+
+    def intern_user(self, user):
+        userId = self.userIds.get(user)
+        if userId is None:
+            userId = len(self.users)
+            self.userIds[user] = userId
+            self.users.append(user)
+            for column in self.columns:
+                column.append(None)
+        return userId
+
+    def intern_token(self, token):
+        tokenId = self.tokenIds.get(token)
+        if tokenId is None:
+            tokenId = len(self.tokens)
+            self.tokenIds[token] = tokenId
+            self.tokens.append(token)
+            self.columns.append([None] * len(self.users))
+            self.totals.append(0)
+        return tokenId
+
+    def add_amount(self, user, token, amount):
+        tokenId = self.intern_token(token)
+        userId = self.intern_user(user)
+        column = self.columns[tokenId]
+        column[userId] = amount if column[userId] is None else column[userId] + amount
+        self.totals[tokenId] += amount
+
+    def add_claims(self, claims):
+        """
+        Add {user: {token: amount}}
+        """
+        for user, userClaims in claims.items():
+            for token, amount in userClaims.items():
+                self.add_amount(user, token, amount)
+
+    def add_tree_claims(self, claims):
+        """
+        Add the claims of a published rewards tree, {user: {tokens, cumulativeAmounts}}
+        """
+        for user, claim in claims.items():
+            for token, amount in zip(claim["tokens"], claim["cumulativeAmounts"]):
+                self.add_amount(user, token, int(amount))
+
+    def add(self, other):
+        """
+        Merge another ledger: its users and tokens are interned once, then each of its columns is added to ours
+        """
+        userMap = [self.intern_user(user) for user in other.users]
+        for otherTokenId, token in enumerate(other.tokens):
+            tokenId = self.intern_token(token)
+            column = self.columns[tokenId]
+            for otherUserId, amount in enumerate(other.columns[otherTokenId]):
+                if amount is None:
+                    continue
+                userId = userMap[otherUserId]
+                column[userId] = (
+                    amount if column[userId] is None else column[userId] + amount
+                )
+            self.totals[tokenId] += other.totals[otherTokenId]
+
+    def add_column_values(self, user, tokens, amounts):
+        """
+        Add a user's amounts, one per token
+        """
+        userId = self.intern_user(user)
+        for token, amount in zip(tokens, amounts):
+            tokenId = self.intern_token(token)
+            column = self.columns[tokenId]
+            column[userId] = (
+                amount if column[userId] is None else column[userId] + amount
+            )
+            self.totals[tokenId] += amount
+
+    def get(self, user, token, default=0):
+        userId = self.userIds.get(user)
+        tokenId = self.tokenIds.get(token)
+        if userId is None or tokenId is None:
+            return default
+        amount = self.columns[tokenId][userId]
+        return default if amount is None else amount
+
+    def user_amounts(self, userId):
+        """
+        (tokens, amounts) for a user, in token order
+        """
+        tokens = []
+        amounts = []
+        for tokenId, column in enumerate(self.columns):
+            if column[userId] is not None:
+                tokens.append(self.tokens[tokenId])
+                amounts.append(column[userId])
+        return (tokens, amounts)
+
+    def iter_users(self, key=None):
+        """
+        (user, tokens, amounts) for every user, sorted by key(user) if given
+        """
+        userIds = range(len(self.users))
+        if key:
+            userIds = sorted(userIds, key=lambda userId: key(self.users[userId]))
+        for userId in userIds:
+            (tokens, amounts) = self.user_amounts(userId)
+            yield (self.users[userId], tokens, amounts)
+
+    def token_totals(self):
+        return dict(zip(self.tokens, self.totals))
+
+
+def address_key(user):
+    return user.lower()
+
+
+def merge_cumulative(previousClaims, new, tokenOrder=()):
+    """
+    Merge join previous tree claims, as (user, claim) in address order, with a ledger of new rewards
+    Returns (ledger, previousIndices, previousAmounts), a ledger of cumulative amounts with users in address order
+    and each previous user's index and first cumulative amount, as the rest of the cycle needs from the previous tree
+    The previous claims are read once as a stream, only the new rewards and the result are held in memory
+    tokenOrder interns tokens first (the previous tree's tokenTotals), so listing order is kept from cycle to cycle
+    """
+    result = RewardsLedger()
+    for token in tokenOrder:
+        result.intern_token(token)
+    previousIndices = {}
+    previousAmounts = {}
+
+    newUserIds = sorted(
+        range(len(new.users)), key=lambda userId: address_key(new.users[userId])
+    )
+    position = 0
+
+    def add_new(userId, user):
+        (tokens, amounts) = new.user_amounts(userId)
+        result.add_column_values(user, tokens, amounts)
+
+    lastKey = None
+    for user, claim in previousClaims:
+        key = address_key(user)
+        assert (
+            lastKey is None or key > lastKey
+        ), "Previous claims must be in address order"
+        lastKey = key
+
+        while (
+            position < len(newUserIds)
+            and address_key(new.users[newUserIds[position]]) < key
+        ):
+            add_new(newUserIds[position], new.users[newUserIds[position]])
+            position += 1
+
+        amounts = [int(amount) for amount in claim["cumulativeAmounts"]]
+        previousIndices[user] = int(claim["index"], 16)
+        previousAmounts[user] = amounts[0] if amounts else 0
+        result.add_column_values(user, claim["tokens"], amounts)
+        if (
+            position < len(newUserIds)
+            and address_key(new.users[newUserIds[position]]) == key
+        ):
+            add_new(newUserIds[position], user)
+            position += 1
+
+    for userId in newUserIds[position:]:
+        add_new(userId, new.users[userId])
+    return (result, previousIndices, previousAmounts)
+
+
+def extend_indices(users, previousIndices):
+    """
+    Users keep their previous index, the rest are numbered after the highest previous index in the given order
+    """
+    indices = {}
+    nextIndex = max(previousIndices.values(), default=-1) + 1
+    for user in users:
+        index = previousIndices.get(user)
+        if index is None:
+            index = nextIndex
+            nextIndex += 1
+        indices[user] = index
+    return indices
+
+
+class LedgerClaims(Mapping):
+    """
+    Read only {user: {token: amount}} view of a ledger
+    """
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def __getitem__(self, user):
+        (tokens, amounts) = self.ledger.user_amounts(self.ledger.userIds[user])
+        return dict(zip(tokens, amounts))
+
+    def __iter__(self):
+        return iter(self.ledger.users)
+
+    def __len__(self):
+        return len(self.ledger.users)
+
+    def __contains__(self, user):
+        return user in self.ledger.userIds
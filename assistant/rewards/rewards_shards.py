@@ -0,0 +1,118 @@
+import itertools
+import json
+import os
+
+from assistant.rewards.claim_encoder import encode_claim
+from assistant.rewards.merkle_tree import iter_claims_with_proofs
+from eth_utils.hexadecimal import encode_hex
+from helpers.merkle import MerkleTree, keccak
+
+"""
+Rewards tree split into shards keyed by the first byte of the claimant's address, plus a manifest
+
+<directory>/manifest.json holds merkleRoot, cycle, blocks, tokenTotals and each shard's file and keccak256 hash
+<directory>/<prefix>.json holds the claims, with proofs, of users whose address starts with 0x<prefix>
+A claim is checked on its own: its shard against the manifest hash, its node against its fields and its proof against the root
+"""
+
+
+def shard_prefix(user):
+    return user[2:4].lower()
+
+
+def shard_directory(contentFileName):
+    return contentFileName[: -len(".json")]
+
+
+def write_rewards_shards(directory, distribution, tree):
+    """
+    Write shards one at a time, taking each claim's proof from one pass over the tree
+    Returns the files written, manifest last
+    """
+    os.makedirs(directory, exist_ok=True)
+    proofs = tree.get_all_proofs()
+    shards = {}
+    fileNames = []
+
+    users = sorted(distribution["claims"], key=shard_prefix)
+    for prefix, shardUsers in itertools.groupby(users, key=shard_prefix):
+        shardDistribution = {
+            "claims": {user: distribution["claims"][user] for user in shardUsers}
+        }
+        shard = {
+            "merkleRoot": distribution["merkleRoot"],
+            "cycle": distribution["cycle"],
+            "claims": dict(iter_claims_with_proofs(shardDistribution, tree, proofs)),
+        }
+        data = json.dumps(shard).encode()
+
+        fileName = os.path.join(directory, prefix + ".json")
+        with open(fileName, "wb") as f:
+            f.write(data)
+        fileNames.append(fileName)
+        shards[prefix] = {
+            "file": prefix + ".json",
+            "hash": encode_hex(keccak(data)),
+            "claims": len(shard["claims"]),
+        }
+
+    manifest = {
+        "merkleRoot": distribution["merkleRoot"],
+        "cycle": distribution["cycle"],
+        "startBlock": distribution["startBlock"],
+        "endBlock": distribution["endBlock"],
+        "tokenTotals": distribution["tokenTotals"],
+        "shards": shards,
+    }
+    fileName = os.path.join(directory, "manifest.json")
+    with open(fileName, "w") as f:
+        json.dump(manifest, f)
+    fileNames.append(fileName)
+    return fileNames
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        return json.load(f)
+
+
+def verify_claim(claim, merkleRoot):
+    """
+    Check a claim's node against its fields and its proof against the root
+    """
+    node = encode_hex(
+        encode_claim(
+            claim["tokens"],
+            claim["cumulativeAmounts"],
+            int(claim["index"], 16),
+            int(claim["cycle"], 16),
+            claim["user"],
+        )
+    )
+    return node == claim["node"] and MerkleTree.verify(claim["proof"], merkleRoot, node)
+
+
+def load_shard_claim(directory, user, manifest=None):
+    """
+    A user's claim from its shard, verified against the manifest, or None if the user has no claim
+    """
+    if not manifest:
+        manifest = load_manifest(directory)
+    shardInfo = manifest["shards"].get(shard_prefix(user))
+    if not shardInfo:
+        return None
+
+    with open(os.path.join(directory, shardInfo["file"]), "rb") as f:
+        data = f.read()
+    if encode_hex(keccak(data)) != shardInfo["hash"]:
+        raise ValueError("Shard {} failed its content hash".format(shardInfo["file"]))
+
+    shard = json.loads(data)
+    claim = shard["claims"].get(user)
+    if not claim:
+        return None
+    if shard["merkleRoot"] != manifest["merkleRoot"] or not verify_claim(
+        claim, manifest["merkleRoot"]
+    ):
+        raise ValueError("Claim for {} doesn't verify against the root".format(user))
+    return claim
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+import time
+
+from assistant.rewards.config import rewards_config
+from assistant.rewards.geyser_checkpoints import canonical_hash
+from rich.console import Console
+
+console = Console()
+
+"""
+Content addressed cache of rewards stage results on disk, shared by cycles, re-runs and keepers on other machines
+
+<directory>/<stage>/<key>.stage: magic, sha256 of the payload, then the pickled (stage, key, value)
+The key is a hash of everything the stage's result depends on, so an entry never needs invalidating, only evicting
+Entries are pickles, so the directory must only be writable by trusted keepers
+An entry that fails its hash or can't be unpickled is deleted and recomputed. Entries are evicted by age, then oldest first down to a size limit
+"""
+
+magic = b"BRSC"
+suffix = ".stage"
+# Part of every key, bump when a stage's result or how it's computed changes
+STAGE_CACHE_VERSION = 1
+
+
+def stage_key(stage, inputs):
+    return canonical_hash(
+        {"version": STAGE_CACHE_VERSION, "stage": stage, "inputs": inputs}
+    )
+
+
+class StageCache:
+    def __init__(self, directory, maxAge, maxBytes):
+        self.directory = directory
+        self.maxAge = maxAge
+        self.maxBytes = maxBytes
+
+    def file_name(self, stage, key):
+        return os.path.join(self.directory, stage, key + suffix)
+
+    def load(self, stage, key):
+        """
+        The cached result, or None if there is none or it fails its integrity check
+        """
+        fileName = self.file_name(stage, key)
+        try:
+            with open(fileName, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        payload = data[36:]
+        if data[:4] != magic or data[4:36] != hashlib.sha256(payload).digest():
+            console.print(
+                "[bold red]Corrupt stage cache entry " + fileName + "[/bold red]"
+            )
+            remove_entry(fileName)
+            return None
+        # Classes pickled by another version of the code may no longer load
+        try:
+            (storedStage, storedKey, value) = pickle.loads(payload)
+        except Exception as e:
+            console.print(
+                "[bold red]Unreadable stage cache entry {}: {}[/bold red]".format(
+                    fileName, e
+                )
+            )
+            remove_entry(fileName)
+            return None
+        if (storedStage, storedKey) != (stage, key):
+            console.print(
+                "[bold red]Misplaced stage cache entry " + fileName + "[/bold red]"
+            )
+            remove_entry(fileName)
+            return None
+
+        # Loading refreshes an entry, so size eviction drops the least recently used
+        os.utime(fileName)
+        console.print(
+            "[green]Loaded {} {} from stage cache[/green]".format(stage, key[:12])
+        )
+        return value
+
+    def save(self, stage, key, value):
+        payload = pickle.dumps((stage, key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        fileName = self.file_name(stage, key)
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+        # Other processes may write the same entry, each writes its own temporary file
+        tmpFile = "{}.{}.tmp".format(fileName, os.getpid())
+        with open(tmpFile, "wb") as f:
+            f.write(magic + hashlib.sha256(payload).digest() + payload)
+        os.replace(tmpFile, fileName)
+        self.evict()
+
+    def get(self, stage, key, compute):
+        value = self.load(stage, key)
+        if value is None:
+            value = compute()
+            self.save(stage, key, value)
+        return value
+
+    def entries(self):
+        """
+        (modified time, size, file name) of every entry and leftover temporary file
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for stage in os.scandir(self.directory):
+            if not stage.is_dir():
+                continue
+            for entry in os.scandir(stage.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, now=None):
+        """
+        Remove entries older than maxAge, then the oldest until the rest fit in maxBytes
+        """
+        now = now or time.time()
+        entries = sorted(self.entries())
+        kept = []
+        for modified, size, fileName in entries:
+            if now - modified > self.maxAge:
+                remove_entry(fileName)
+            else:
+                kept.append((modified, size, fileName))
+
+        total = sum(size for modified, size, fileName in kept)
+        for modified, size, fileName in kept:
+            if total <= self.maxBytes:
+                break
+            remove_entry(fileName)
+            total -= size
+
+
+def remove_entry(fileName):
+    try:
+        os.remove(fileName)
+    except FileNotFoundError:
+        pass
+
+
+def get_stage_cache():
+    """
+    The configured stage cache, or None if it's disabled
+    """
+    if not rewards_config.stageCache:
+        return None
+    return StageCache(
+        rewards_config.stageCacheDir,
+        rewards_config.stageCacheMaxAge,
+        rewards_config.stageCacheMaxBytes,
+    )
@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tqdm import tqdm
+
+# Fragments of the errors providers return when a getLogs response would be too large
+overflowMessages = [
+    "-32005",
+    "more than",
+    "too many",
+    "too large",
+    "response size",
+    "block range",
+    "limit exceeded",
+]
+
+
+def is_range_overflow(error):
+    """
+    Whether a getLogs error means the block range should be split
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in overflowMessages)
+
+
+class AdaptiveRangePlanner:
+    """
+    Chooses block ranges for getLogs scans
+    The window doubles after a sparse range and halves after a busy range, staying within [minWindow, maxWindow]
+    An initial density (logs per block) from previous runs can be given to start at the right window size
+    """
+
+    def __init__(
+        self, density=None, targetLogs=1000, window=1000, minWindow=1, maxWindow=100000
+    ):
+        self.targetLogs = targetLogs
+        self.minWindow = minWindow
+        self.maxWindow = maxWindow
+
+        if density is not None:
+            window = targetLogs / density if density > 0 else maxWindow
+        self.window = self.clamp(window)
+
+    def clamp(self, window):
+        return int(max(self.minWindow, min(self.maxWindow, window)))
+
+    def next_range(self, start, endBlock):
+        return (start, min(start + self.window - 1, endBlock))
+
+    def record(self, blocks, logCount):
+        """
+        Adjust the window after a successful request
+        """
+        if logCount > self.targetLogs:
+            self.window = self.clamp(blocks // 2)
+        elif logCount < self.targetLogs // 4 and blocks >= self.window:
+            self.window = self.clamp(self.window * 2)
+
+    def record_overflow(self, blocks):
+        """
+        Halve the window after the provider rejected a range of the given size
+        """
+        self.window = self.clamp(blocks // 2)
+
+
+class RateLimiter:
+    """
+    Spaces out calls from any number of threads to at most maxPerSecond
+    """
+
+    def __init__(self, maxPerSecond=None):
+        self.interval = 1 / maxPerSecond if maxPerSecond else 0
+        self.nextCall = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.nextCall - now
+            self.nextCall = max(now, self.nextCall) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch_range(fetch, fromBlock, toBlock, planner, limiter):
+    """
+    Fetch a range, recursively splitting it in half while the provider rejects it as too large
+    """
+    limiter.wait()
+    try:
+        return fetch(fromBlock, toBlock)
+    except Exception as e:
+        if fromBlock == toBlock or not is_range_overflow(e):
+            raise
+        planner.record_overflow(toBlock - fromBlock + 1)
+        middle = (fromBlock + toBlock) // 2
+        return fetch_range(fetch, fromBlock, middle, planner, limiter) + fetch_range(
+            fetch, middle + 1, toBlock, planner, limiter
+        )
+
+
+def scan_logs(fetch, startBlock, endBlock, planner, workers=1, maxPerSecond=None):
+    """
+    Scan [startBlock, endBlock] with fetch(fromBlock, toBlock), splitting any range the provider rejects as too large
+    With more than one worker, ranges are fetched concurrently from a thread pool, at most maxPerSecond requests per second
+    Returns all logs, in block order
+    """
+    if workers > 1:
+        return scan_logs_concurrent(
+            fetch, startBlock, endBlock, planner, workers, maxPerSecond
+        )
+
+    logs = []
+    start = startBlock
+
+    with tqdm(total=endBlock - startBlock + 1) as progress:
+        while start <= endBlock:
+            (fromBlock, toBlock) = planner.next_range(start, endBlock)
+            blocks = toBlock - fromBlock + 1
+
+            try:
+                chunk = fetch(fromBlock, toBlock)
+            except Exception as e:
+                if blocks == 1 or not is_range_overflow(e):
+                    raise
+                planner.record_overflow(blocks)
+                continue
+
+            planner.record(blocks, len(chunk))
+            logs.extend(chunk)
+            progress.update(blocks)
+            start = toBlock + 1
+
+    return logs
+
+
+def scan_logs_concurrent(fetch, startBlock, endBlock, planner, workers, maxPerSecond):
+    """
+    Keep up to 2 ranges per worker in flight, sizing each new range from the planner's current window
+    Chunks complete out of order and are put back in block order at the end
+    """
+    limiter = RateLimiter(maxPerSecond)
+    pending = {}
+    chunks = []
+    start = startBlock
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(
+        total=endBlock - startBlock + 1
+    ) as progress:
+        while start <= endBlock or pending:
+            while start <= endBlock and len(pending) < workers * 2:
+                (fromBlock, toBlock) = planner.next_range(start, endBlock)
+                future = executor.submit(
+                    fetch_range, fetch, fromBlock, toBlock, planner, limiter
+                )
+                pending[future] = (fromBlock, toBlock)
+                start = toBlock + 1
+
+            (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (fromBlock, toBlock) = pending.pop(future)
+                chunk = future.result()
+                planner.record(toBlock - fromBlock + 1, len(chunk))
+                chunks.append((fromBlock, chunk))
+                progress.update(toBlock - fromBlock + 1)
+
+    chunks.sort(key=lambda entry: entry[0])
+    return [log for (_, chunk) in chunks for log in chunk]
@@ -1,47 +1,190 @@
-from itertools import zip_longest
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-from brownie import web3
 from eth_utils import encode_hex
+from eth_utils.hexadecimal import decode_hex
+
+try:
+    from Crypto.Hash import keccak as keccak_binding
+
+    def keccak(data):
+        return keccak_binding.new(digest_bits=256, data=data).digest()
+
+
+except ImportError:
+    from eth_hash.auto import keccak
+
+"""
+Merkle tree of keccak256 leaves with sorted pair hashing, as verified by OpenZeppelin MerkleProof
+Shared by the rewards tree and the airdrop tooling
+
+Each layer is a single bytearray of 32 byte nodes, leaves are sorted and deduplicated
+A node without a pair is promoted to the next layer unchanged
+"""
+
+nodeSize = 32
+
+
+def hash_pair(a, b):
+    return keccak(a + b if a <= b else b + a)
+
+
+def hash_leaves(elements):
+    return [keccak(decode_hex(el)) for el in elements]
+
+
+def split(values, numChunks):
+    chunkSize = -(-len(values) // numChunks)
+    return [values[i : i + chunkSize] for i in range(0, len(values), chunkSize)]
 
 
 class MerkleTree:
     def __init__(self, elements):
-        self.elements = sorted(set(web3.keccak(hexstr=el) for el in elements))
-        self.layers = MerkleTree.get_layers(self.elements)
+        """
+        elements are hex encoded leaf preimages
+        """
+        self.layers = MerkleTree.get_layers(
+            MerkleTree.pack_leaves(keccak(decode_hex(el)) for el in elements)
+        )
+
+    @classmethod
+    def build(cls, elements, workers=1):
+        """
+        Build from hex encoded leaf preimages, in a process pool when workers > 1
+        Leaves are hashed in contiguous chunks, then each aligned block of sorted leaves builds its own lower layers
+        Blocks hold a power of two leaves, so their layers are exactly the matching slices of the serial build
+        """
+        elements = list(elements)
+        if workers <= 1 or len(elements) < 2 * workers:
+            return cls(elements)
+
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            leaves = MerkleTree.pack_leaves(
+                leaf
+                for chunk in executor.map(hash_leaves, split(elements, workers))
+                for leaf in chunk
+            )
+
+            numLeaves = len(leaves) // nodeSize
+            blockLeaves = 1 << (-(-numLeaves // workers) - 1).bit_length()
+            blocks = [
+                bytes(leaves[start : start + blockLeaves * nodeSize])
+                for start in range(0, len(leaves), blockLeaves * nodeSize)
+            ]
+            blockLayers = list(executor.map(MerkleTree.get_layers, blocks))
+
+        # Stitch the block layers level by level, a short last block's top node is promoted unchanged
+        layers = [leaves]
+        for level in range(1, blockLeaves.bit_length()):
+            layers.append(
+                bytearray(
+                    b"".join(
+                        layersOfBlock[min(level, len(layersOfBlock) - 1)]
+                        for layersOfBlock in blockLayers
+                    )
+                )
+            )
+
+        tree = cls.__new__(cls)
+        tree.layers = layers + MerkleTree.get_layers(layers[-1])[1:]
+        return tree
+
+    @classmethod
+    def from_leaf_hashes(cls, leaves):
+        tree = cls.__new__(cls)
+        tree.layers = MerkleTree.get_layers(MerkleTree.pack_leaves(leaves))
+        return tree
+
+    @staticmethod
+    def pack_leaves(leaves):
+        return bytearray(b"".join(sorted(set(leaves))))
 
     @property
     def root(self):
-        return self.layers[-1][0]
+        return bytes(self.layers[-1][:nodeSize])
+
+    @property
+    def num_leaves(self):
+        return len(self.layers[0]) // nodeSize
+
+    def get_node(self, level, idx):
+        return bytes(self.layers[level][idx * nodeSize : (idx + 1) * nodeSize])
+
+    def get_leaf_position(self, leaf):
+        """
+        Binary search the sorted leaves for a leaf hash
+        """
+        leaves = memoryview(self.layers[0])
+        (low, high) = (0, self.num_leaves)
+        while low < high:
+            mid = (low + high) // 2
+            if leaves[mid * nodeSize : (mid + 1) * nodeSize].tobytes() < leaf:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.num_leaves or self.get_node(0, low) != leaf:
+            raise KeyError(encode_hex(leaf))
+        return low
+
+    def get_position(self, el):
+        """
+        Position of an encoded element's leaf among the sorted leaves
+        """
+        return self.get_leaf_position(keccak(decode_hex(el)))
 
     def get_proof(self, el):
-        el = web3.keccak(hexstr=el)
-        idx = self.elements.index(el)
+        return self.get_proof_at(self.get_position(el))
+
+    def get_proof_at(self, idx):
         proof = []
-        for layer in self.layers:
-            pair_idx = idx + 1 if idx % 2 == 0 else idx - 1
-            if pair_idx < len(layer):
-                proof.append(encode_hex(layer[pair_idx]))
+        for level, layer in enumerate(self.layers):
+            pair_idx = idx ^ 1
+            if pair_idx * nodeSize < len(layer):
+                proof.append(encode_hex(self.get_node(level, pair_idx)))
             idx //= 2
         return proof
 
+    def get_all_proofs(self):
+        """
+        Proofs for every leaf, in sorted leaf order, from a single pass over the layers
+        """
+        proofs = [[] for idx in range(self.num_leaves)]
+        for level, layer in enumerate(self.layers):
+            encodedLayer = [
+                "0x" + layer[start : start + nodeSize].hex()
+                for start in range(0, len(layer), nodeSize)
+            ]
+            for idx, proof in enumerate(proofs):
+                pair_idx = (idx >> level) ^ 1
+                if pair_idx < len(encodedLayer):
+                    proof.append(encodedLayer[pair_idx])
+        return proofs
+
     @staticmethod
-    def get_layers(elements):
-        layers = [elements]
-        while len(layers[-1]) > 1:
-            layers.append(MerkleTree.get_next_layer(layers[-1]))
-        return layers
+    def verify(proof, root, el):
+        """
+        Check a proof for an encoded element, as MerkleProof.verify does on chain
+        """
+        node = keccak(decode_hex(el))
+        for sibling in proof:
+            node = hash_pair(node, decode_hex(sibling))
+        return node == (decode_hex(root) if isinstance(root, str) else bytes(root))
 
     @staticmethod
-    def get_next_layer(elements):
-        return [
-            MerkleTree.combined_hash(a, b)
-            for a, b in zip_longest(elements[::2], elements[1::2])
-        ]
+    def get_layers(leaves):
+        layers = [leaves]
+        while len(layers[-1]) > nodeSize:
+            layers.append(MerkleTree.get_next_layer(layers[-1]))
+        return layers
 
     @staticmethod
-    def combined_hash(a, b):
-        if a is None:
-            return b
-        if b is None:
-            return a
-        return web3.keccak(b"".join(sorted([a, b])))
+    def get_next_layer(layer):
+        layer = bytes(layer)
+        nextLayer = bytearray()
+        for start in range(0, len(layer), 2 * nodeSize):
+            a = layer[start : start + nodeSize]
+            b = layer[start + nodeSize : start + 2 * nodeSize]
+            nextLayer += hash_pair(a, b) if b else a
+        return nextLayer
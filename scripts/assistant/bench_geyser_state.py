@@ -0,0 +1,76 @@
+import random
+import resource
+import time
+
+from assistant.rewards.BadgerGeyserMock import BadgerGeyserMock
+from assistant.rewards.calc_stakes import events_to_actions, process_actions
+from assistant.rewards.columnar_share_seconds import columnar_share_seconds
+from tabulate import tabulate
+
+numEvents = 1000000
+numUsers = 20000
+startTimestamp = 1600000000
+
+
+def synthetic_events(numEvents, numUsers, seed=1):
+    """
+    Random stakes and unstakes spread over numUsers, a few per block
+    """
+    rng = random.Random(seed)
+    balances = [0] * numUsers
+    events = []
+    block = 0
+    while len(events) < numEvents:
+        block += 1
+        for logIndex in range(rng.randint(1, 4)):
+            userIndex = rng.randrange(numUsers)
+            if balances[userIndex] > 0 and rng.random() < 0.3:
+                amount = rng.randint(1, balances[userIndex])
+                balances[userIndex] -= amount
+                event = "Unstaked"
+            else:
+                amount = rng.randint(1, 10 ** 24)
+                balances[userIndex] += amount
+                event = "Staked"
+            events.append(
+                {
+                    "blockNumber": block,
+                    "logIndex": logIndex,
+                    "event": event,
+                    "user": "0x{:040x}".format(userIndex + 1),
+                    "amount": amount,
+                    "total": balances[userIndex],
+                    "timestamp": startTimestamp + block * 13,
+                }
+            )
+    return (events, startTimestamp + block * 13)
+
+
+def main():
+    """
+    Time grouping and replaying a synthetic geyser history, and report peak memory
+    """
+    (events, endTime) = synthetic_events(numEvents, numUsers)
+    startTime = endTime - 86400
+
+    start = time.perf_counter()
+    actions = events_to_actions(events)
+    grouped = time.perf_counter()
+
+    geyserMock = BadgerGeyserMock("bench")
+    geyserMock.set_current_period(startTime, endTime)
+    process_actions(geyserMock, actions, 0, 0)
+    processed = time.perf_counter()
+
+    columnar_share_seconds(events, startTime, endTime)
+    columnar = time.perf_counter()
+
+    table = [
+        ["events", len(events)],
+        ["users", len(geyserMock.users)],
+        ["group (us/event)", (grouped - start) * 1e6 / len(events)],
+        ["replay (us/event)", (processed - grouped) * 1e6 / len(events)],
+        ["columnar (us/event)", (columnar - processed) * 1e6 / len(events)],
+        ["peak RSS (MB)", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024],
+    ]
+    print(tabulate(table, headers=["metric", "value"]))
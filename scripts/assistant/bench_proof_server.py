@@ -0,0 +1,85 @@
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from assistant.rewards.proof_server import ProofServer
+from assistant.rewards.rewards_file import write_rewards_file
+from tabulate import tabulate
+
+numClaims = 50000
+numClients = 8
+requestsPerClient = 2000
+
+
+def synthetic_rewards_file(fileName, numClaims, seed=1):
+    rng = random.Random(seed)
+    claims = {}
+    for i in range(numClaims):
+        user = "0x{:040x}".format(rng.getrandbits(160))
+        claims[user] = {
+            "index": hex(i),
+            "user": user,
+            "cycle": hex(10),
+            "tokens": ["0x3472A5A71965499acd81997a54BBA8D852C6E53d"],
+            "cumulativeAmounts": [str(rng.getrandbits(80))],
+            "proof": ["0x{:064x}".format(rng.getrandbits(256)) for j in range(16)],
+            "node": "0x" + "00" * 116,
+        }
+    distribution = {
+        "merkleRoot": "0x" + "00" * 32,
+        "cycle": 10,
+        "startBlock": "0",
+        "endBlock": "1",
+        "tokenTotals": {},
+        "claims": claims,
+        "metadata": {},
+    }
+    write_rewards_file(fileName, distribution, claims.items())
+    return list(claims)
+
+
+def main():
+    """
+    Load test the proof server with keep-alive clients requesting random proofs
+    """
+    fileName = os.path.join(tempfile.mkdtemp(), "rewards-bench.json")
+    users = synthetic_rewards_file(fileName, numClaims)
+
+    server = ProofServer(("127.0.0.1", 0), fileName)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    def client(seed):
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for i in range(requestsPerClient):
+            connection.request("GET", "/proof/" + rng.choice(users))
+            response = connection.getresponse()
+            assert response.status == 200
+            json.loads(response.read())
+        connection.close()
+
+    start = time.perf_counter()
+    clients = [
+        threading.Thread(target=client, args=(seed,)) for seed in range(numClients)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latency = server.metrics.snapshot()["latencyMs"]
+    table = [
+        ["claims", numClaims],
+        ["requests", numClients * requestsPerClient],
+        ["requests/s", numClients * requestsPerClient / elapsed],
+        ["server p50 (ms)", latency["p50"]],
+        ["server p99 (ms)", latency["p99"]],
+    ]
+    print(tabulate(table, headers=["metric", "value"]))
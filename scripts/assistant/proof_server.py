@@ -0,0 +1,34 @@
+from assistant.rewards.config import rewards_config
+from assistant.rewards.proof_server import ProofServer, watch_latest
+from assistant.rewards.rewards_assistant import (
+    content_hash_to_filename,
+    fetchCurrentMerkleData,
+)
+from config.badger_config import badger_config
+from rich.console import Console
+from scripts.systems.badger_system import connect_badger
+
+console = Console()
+
+
+def main():
+    """
+    Serve proofs for the approved rewards tree, following new roots as they're approved
+    """
+    badger = connect_badger(badger_config.prod_json)
+
+    def resolve_latest():
+        return content_hash_to_filename(fetchCurrentMerkleData(badger)["contentHash"])
+
+    server = ProofServer(
+        (rewards_config.proofServerHost, rewards_config.proofServerPort),
+        resolve_latest(),
+    )
+    watch_latest(server, resolve_latest, rewards_config.proofServerPollInterval)
+
+    console.print(
+        "[bold cyan]Proof server on port {}[/bold cyan]".format(
+            rewards_config.proofServerPort
+        )
+    )
+    server.serve_forever()
@@ -5,7 +5,11 @@ from config.badger_config import badger_config
 from rich.console import Console
 from scripts.systems.badger_system import connect_badger
 
-from assistant.rewards.rewards_assistant import fetch_current_rewards_tree, run_action
+from assistant.rewards.rewards_assistant import (
+    close_rewards_tree,
+    fetch_current_rewards_tree,
+    run_action,
+)
 
 console = Console()
 
@@ -22,6 +26,7 @@ def main():
     currentRewards = fetch_current_rewards_tree(badger)
 
     lastClaimEnd = int(currentRewards["endBlock"])
+    close_rewards_tree(currentRewards)
     startBlock = lastClaimEnd + 1
 
     # Claim at current block
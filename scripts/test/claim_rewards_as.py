@@ -1,6 +1,6 @@
+from assistant.rewards.claim_index import ClaimIndex
 from helpers.time_utils import days
 import os
-import json
 from scripts.systems.badger_system import connect_badger
 import warnings
 from tabulate import tabulate
@@ -21,13 +21,12 @@ def main():
     token = badger.token
     tree = badger.badgerTree
 
-    with open(rewardsFile) as f:
-        merkleTree = json.load(f)
+    claims = ClaimIndex(rewardsFile)
 
     users = ["0xe450058b0023047C78Ca50a32356dA27DF984734"]
     for user in users:
         accounts.at(user, force=True)
-        claim = merkleTree["claims"][user]
+        claim = claims.get_claim(user)
         pre = badger.token.balanceOf(user)
         print(pre)
         encoded = tree.claim.encode_input(
@@ -1,3 +1,32 @@
+def sample_distribution(numClaims):
+    """
+    A rewards tree with numClaims claims, shared by the rewards file, claim index and proof server tests
+    """
+    claims = {}
+    for i in range(numClaims):
+        user = "0x{:040x}".format(i + 1)
+        claims[user] = {
+            "index": hex(i),
+            "user": user,
+            "cycle": hex(5),
+            "tokens": ["0x" + "11" * 20],
+            "cumulativeAmounts": [str(10 ** 24 + i)],
+            "proof": ["0x" + "{:064x}".format(i * j) for j in range(5)],
+            "node": "0x" + "ab" * 116,
+        }
+    return {
+        "merkleRoot": "0x" + "cd" * 32,
+        "cycle": 5,
+        "startBlock": "100",
+        "endBlock": "200",
+        "tokenTotals": {"0x" + "11" * 20: 123456789012345678901234567890},
+        "claims": claims,
+        "metadata": {
+            "0x{:040x}".format(1): {"shareSeconds": 10, "shareSecondsInRange": 5}
+        },
+    }
+
+
 # #!/usr/bin/python3
 # from helpers.proxy_utils import deploy_proxy
 # import pytest
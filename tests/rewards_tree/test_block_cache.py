@@ -0,0 +1,100 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from hexbytes import HexBytes
+
+from assistant.rewards import block_cache
+from assistant.rewards.block_cache import BlockCache
+
+
+def block_hash(blockNumber):
+    return HexBytes(bytes([blockNumber % 256, 0xAB]) * 16)
+
+
+class FakeHTTPProvider:
+    endpoint_uri = "http://node"
+
+    def get_request_kwargs(self):
+        return {"timeout": 10}
+
+
+def patch_node(monkeypatch, path):
+    """
+    A node at height 100 reached through the batch or single block fetch path
+    Returns the list of blocks requested from it
+    """
+    requested = []
+
+    def make_post_request(endpointUri, data, timeout):
+        assert (endpointUri, timeout) == ("http://node", 10)
+        results = []
+        for entry in json.loads(data):
+            blockNumber = int(entry["params"][0], 16)
+            requested.append(blockNumber)
+            result = {
+                "number": hex(blockNumber),
+                "hash": "0x" + block_hash(blockNumber).hex().replace("0x", "").upper(),
+                "timestamp": hex(blockNumber * 13),
+            }
+            results.append({"jsonrpc": "2.0", "id": entry["id"], "result": result})
+        return json.dumps(results).encode()
+
+    def get_block(blockNumber):
+        requested.append(blockNumber)
+        return {"hash": block_hash(blockNumber), "timestamp": blockNumber * 13}
+
+    provider = FakeHTTPProvider() if path == "batch" else object()
+    monkeypatch.setattr(block_cache, "HTTPProvider", FakeHTTPProvider)
+    monkeypatch.setattr(block_cache, "make_post_request", make_post_request)
+    monkeypatch.setattr(
+        block_cache,
+        "web3",
+        SimpleNamespace(provider=provider, eth=SimpleNamespace(getBlock=get_block)),
+    )
+    monkeypatch.setattr(block_cache, "chain", SimpleNamespace(height=100))
+    return requested
+
+
+@pytest.mark.parametrize("path", ["batch", "single"])
+def test_headers_fetched_once_and_finalized_persisted(monkeypatch, tmp_path, path):
+    chain = patch_node(monkeypatch, path)
+    dbPath = str(tmp_path / "blocks.db")
+    cache = BlockCache(dbPath, maxSize=10, confirmations=20)
+
+    headers = cache.get_blocks([50, 79, 80, 81, 99, 50])
+    assert sorted(chain) == [50, 79, 80, 81, 99]
+    # Both paths give 0x prefixed lowercase hashes, geyser stage cache keys are built from them
+    for blockNumber, header in headers.items():
+        assert header == {
+            "number": blockNumber,
+            "hash": "0x" + bytes(block_hash(blockNumber)).hex(),
+            "timestamp": blockNumber * 13,
+        }
+
+    # Repeats come from memory
+    assert cache.get_blocks([50, 99]) == {50: headers[50], 99: headers[99]}
+    assert cache.get_timestamp(81) == 81 * 13
+    assert len(chain) == 5
+
+    # Only blocks at least confirmations deep are on disk
+    assert sorted(cache.load_headers(list(headers))) == [50, 79, 80]
+
+    # A new process reads finalized blocks from disk, and fetches the rest again
+    del chain[:]
+    reopened = BlockCache(dbPath, maxSize=10, confirmations=20)
+    assert reopened.get_blocks(list(headers)) == headers
+    assert sorted(chain) == [81, 99]
+
+
+@pytest.mark.parametrize("path", ["batch", "single"])
+def test_lru_bounded(monkeypatch, tmp_path, path):
+    chain = patch_node(monkeypatch, path)
+    cache = BlockCache(str(tmp_path / "blocks.db"), maxSize=3, confirmations=20)
+    cache.get_blocks([90, 91, 92])
+    cache.get_block(90)
+    cache.get_block(93)
+    assert list(cache.headers) == [92, 90, 93]
+
+    cache.get_block(91)
+    assert chain.count(91) == 2
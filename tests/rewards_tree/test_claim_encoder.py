@@ -0,0 +1,38 @@
+import random
+
+from assistant.rewards.claim_encoder import encode_claim
+from brownie import ClaimEncoder, accounts
+from eth_utils.hexadecimal import encode_hex
+
+
+def random_claim(rng, numTokens):
+    return (
+        ["0x{:040x}".format(rng.getrandbits(160)) for i in range(numTokens)],
+        [str(rng.getrandbits(rng.randint(1, 256))) for i in range(numTokens)],
+        rng.randint(0, 100000),
+        rng.randint(0, 10000),
+        "0x{:040x}".format(rng.getrandbits(160)),
+    )
+
+
+def test_encode_claim_layout():
+    token = "0x" + "11" * 20
+    account = "0x" + "22" * 20
+    encoded = encode_claim([token], ["5"], 3, 7, account)
+
+    assert len(encoded) == 32 + 20 + 32 + 32 + 32
+    assert int.from_bytes(encoded[:32], "big") == 3
+    assert encoded[32:52] == b"\x22" * 20
+    assert int.from_bytes(encoded[52:84], "big") == 7
+    assert encoded[84:116] == b"\0" * 12 + b"\x11" * 20
+    assert int.from_bytes(encoded[116:], "big") == 5
+
+
+def test_encode_claim_matches_claim_encoder():
+    encoder = ClaimEncoder.deploy({"from": accounts[0]})
+    rng = random.Random(1)
+    for numTokens in [0, 1, 2, 5]:
+        claim = random_claim(rng, numTokens)
+        assert encode_hex(encoder.encodeClaim(*claim)[0]) == encode_hex(
+            encode_claim(*claim)
+        )
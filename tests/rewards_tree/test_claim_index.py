@@ -0,0 +1,58 @@
+import json
+import os
+
+from assistant.rewards.claim_index import (
+    ClaimIndex,
+    build_claim_index,
+    index_file_name,
+)
+from assistant.rewards.rewards_file import write_rewards_file
+from tests.rewards_tree.fixtures import sample_distribution
+
+
+def test_claim_index_lookups(tmp_path):
+    distribution = sample_distribution(300)
+    fileName = str(tmp_path / "rewards.json")
+    write_rewards_file(fileName, distribution, distribution["claims"].items())
+    build_claim_index(fileName)
+
+    with ClaimIndex(fileName) as claims:
+        assert len(claims) == len(distribution["claims"])
+        for user, claim in distribution["claims"].items():
+            assert claims.get_claim(user) == claim
+            assert claims.get_claim(user.upper().replace("0X", "0x")) == claim
+        assert claims.get_claim("0x" + "ff" * 20) is None
+        assert "0x" + "00" * 20 not in claims
+        assert dict(claims.items()) == distribution["claims"]
+
+
+def test_claim_index_built_on_open(tmp_path):
+    distribution = sample_distribution(3)
+    fileName = str(tmp_path / "rewards.json")
+    with open(fileName, "w") as f:
+        json.dump(distribution, f)
+
+    with ClaimIndex(fileName) as claims:
+        for user, claim in distribution["claims"].items():
+            assert claims.get_claim(user) == claim
+
+
+def test_invalid_index_rebuilt_on_open(tmp_path):
+    distribution = sample_distribution(50)
+    fileName = str(tmp_path / "rewards.json")
+    write_rewards_file(fileName, distribution, distribution["claims"].items())
+    indexFile = build_claim_index(fileName)
+    assert sorted(os.listdir(str(tmp_path))) == ["rewards.json", "rewards.json.idx"]
+
+    with open(indexFile, "rb") as f:
+        data = f.read()
+
+    # A half written index whose header promises more records than it holds, an empty file, and another file
+    for invalid in (data[: len(data) // 2], b"", b"{}" * 100):
+        with open(indexFile, "wb") as f:
+            f.write(invalid)
+        with ClaimIndex(fileName) as claims:
+            assert len(claims) == 50
+            assert dict(claims.items()) == distribution["claims"]
+        with open(index_file_name(fileName), "rb") as f:
+            assert f.read() == data
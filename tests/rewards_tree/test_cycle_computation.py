@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+from assistant.rewards import rewards_assistant
+from assistant.rewards.rewards_ledger import RewardsLedger
+from assistant.rewards.stage_cache import StageCache
+
+badger = SimpleNamespace(badgerTree=None, geysers={})
+
+
+def patch_stages(monkeypatch, contentHash, cache=None):
+    calls = []
+
+    def stage(name, result):
+        def compute(*args):
+            calls.append(name)
+            return result
+
+        return compute
+
+    monkeypatch.setattr(rewards_assistant, "cycleComputations", {})
+    monkeypatch.setattr(rewards_assistant, "getNextCycle", lambda badger: 7)
+    monkeypatch.setattr(rewards_assistant, "get_stage_cache", lambda: cache)
+    monkeypatch.setattr(
+        rewards_assistant,
+        "fetchCurrentMerkleData",
+        lambda badger: {"contentHash": contentHash, "root": contentHash},
+    )
+    monkeypatch.setattr(
+        rewards_assistant, "fetch_current_rewards_tree", stage("current", {})
+    )
+    monkeypatch.setattr(
+        rewards_assistant,
+        "calc_geyser_rewards",
+        stage("geyser", SimpleNamespace(inputsHash="0xgeysers")),
+    )
+    monkeypatch.setattr(
+        rewards_assistant,
+        "process_cumulative_rewards",
+        stage(
+            "cumulative",
+            SimpleNamespace(
+                ledger=RewardsLedger(), previousIndices={}, previousAmounts={}
+            ),
+        ),
+    )
+    monkeypatch.setattr(
+        rewards_assistant, "build_merkle_distribution", stage("merkle", ({}, None))
+    )
+    return calls
+
+
+def test_roles_share_stage_results(monkeypatch):
+    calls = patch_stages(monkeypatch, "0x01")
+
+    first = rewards_assistant.get_cycle_computation(badger, 10, 20)
+    first.merkle_distribution()
+    second = rewards_assistant.get_cycle_computation(badger, 10, 20)
+    assert second is first
+    assert second.merkle_distribution() is first.merkle_distribution()
+    assert calls == ["current", "geyser", "cumulative", "merkle"]
+
+    strict = rewards_assistant.get_cycle_computation(badger, 10, 20, strict=True)
+    assert strict is not first
+    strict.merkle_distribution()
+    assert calls == ["current", "geyser", "cumulative", "merkle"] * 2
+
+
+def test_new_range_or_root_replaces_computation(monkeypatch):
+    patch_stages(monkeypatch, "0x01")
+    first = rewards_assistant.get_cycle_computation(badger, 10, 20)
+    assert rewards_assistant.get_cycle_computation(badger, 10, 21) is not first
+
+    patch_stages(monkeypatch, "0x02")
+    assert rewards_assistant.get_cycle_computation(badger, 10, 20) is not first
+    assert len(rewards_assistant.cycleComputations) == 1
+
+
+def test_stages_loaded_from_stage_cache(monkeypatch, tmp_path):
+    cache = StageCache(str(tmp_path), 3600, 1 << 30)
+    calls = patch_stages(monkeypatch, "0x01", cache)
+    rewards_assistant.get_cycle_computation(badger, 10, 20).merkle_distribution()
+    assert calls == ["geyser", "current", "cumulative", "merkle"]
+
+    # Another process with the same cache directory only recomputes the geyser rewards, which cache themselves
+    calls = patch_stages(monkeypatch, "0x01", cache)
+    computation = rewards_assistant.get_cycle_computation(badger, 10, 20)
+    assert computation.merkle_distribution() == ({}, None)
+    assert calls == ["geyser"]
+
+    strict = rewards_assistant.get_cycle_computation(badger, 10, 20, strict=True)
+    assert strict.cache is None
+
+
+def test_recompute_rebuilds_merkle_tree(monkeypatch, tmp_path):
+    cache = StageCache(str(tmp_path), 3600, 1 << 30)
+    calls = patch_stages(monkeypatch, "0x01", cache)
+    computation = rewards_assistant.get_cycle_computation(badger, 10, 20)
+    computation.merkle_distribution()
+
+    # The guardian's check rebuilds the tree from the shared ledger, even with the result cached in memory and on disk
+    computation.merkle_distribution(recompute=True)
+    computation.merkle_distribution(recompute=True)
+    assert calls == ["geyser", "current", "cumulative", "merkle", "merkle", "merkle"]
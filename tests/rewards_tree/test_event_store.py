@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import pytest
+
+from assistant.rewards import calc_stakes
+from assistant.rewards.config import rewards_config
+from assistant.rewards.event_store import GeyserEventStore
+
+first = SimpleNamespace(address="0x" + "11" * 20)
+second = SimpleNamespace(address="0x" + "22" * 20)
+
+
+def stake(block, user, amount):
+    return {
+        "blockNumber": block,
+        "logIndex": 0,
+        "event": "Staked",
+        "user": user,
+        "amount": amount * 10 ** 18,
+        "total": amount * 10 ** 18,
+        "timestamp": block * 13,
+    }
+
+
+# Events on chain for each geyser, one every 50 blocks and one near the head
+onChain = {
+    first.address: [stake(block, "0xa", block) for block in range(100, 1000, 50)]
+    + [stake(995, "0xb", 1)],
+    second.address: [stake(block, "0xc", block) for block in range(125, 1000, 50)],
+}
+
+
+def in_range(events, startBlock, endBlock):
+    return [event for event in events if startBlock <= event["blockNumber"] <= endBlock]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = GeyserEventStore(str(tmp_path / "events.db"))
+    monkeypatch.setattr(calc_stakes, "get_event_store", lambda: store)
+    monkeypatch.setattr(rewards_config, "eventStoreConfirmations", 20)
+    monkeypatch.setattr(calc_stakes, "chain", SimpleNamespace(height=1000))
+    yield store
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    fetches = []
+
+    def fetch_geyser_events(geysers, fromBlock, toBlock, density):
+        fetches.append(([geyser.address for geyser in geysers], fromBlock, toBlock))
+        return {
+            geyser.address: in_range(onChain[geyser.address], fromBlock, toBlock)
+            for geyser in geysers
+        }
+
+    monkeypatch.setattr(calc_stakes, "fetch_geyser_events", fetch_geyser_events)
+    yield fetches
+
+
+def test_repeat_run_only_fetches_new_blocks(store, fetches):
+    events = calc_stakes.sync_geyser_events([first], 100, 500)
+    assert events[first.address] == in_range(onChain[first.address], 100, 500)
+    assert store.get_synced_range(first.address) == (100, 500)
+
+    events = calc_stakes.sync_geyser_events([first], 100, 700)
+    assert events[first.address] == in_range(onChain[first.address], 100, 700)
+    assert fetches == [([first.address], 100, 500), ([first.address], 501, 700)]
+    assert store.get_synced_range(first.address) == (100, 700)
+
+
+def test_unconfirmed_blocks_returned_but_not_persisted(monkeypatch, store, fetches):
+    events = calc_stakes.sync_geyser_events([first], 100, 1000)
+    assert events[first.address] == onChain[first.address]
+
+    # 995 is within eventStoreConfirmations of the head, so only blocks up to 980 are stored
+    assert store.get_synced_range(first.address) == (100, 980)
+    assert store.get_events(first.address, 100, 1000) == in_range(
+        onChain[first.address], 100, 980
+    )
+
+    # The next run fetches the unconfirmed blocks again
+    monkeypatch.setattr(calc_stakes, "chain", SimpleNamespace(height=1100))
+    events = calc_stakes.sync_geyser_events([first], 100, 1000)
+    assert events[first.address] == onChain[first.address]
+    assert fetches[-1] == ([first.address], 981, 1000)
+    assert store.get_synced_range(first.address) == (100, 1000)
+
+
+def test_stored_range_starting_late_is_reset(store, fetches):
+    store.add_events(
+        first.address, in_range(onChain[first.address], 300, 500), 300, 500
+    )
+
+    events = calc_stakes.sync_geyser_events([first], 100, 600)
+    assert events[first.address] == in_range(onChain[first.address], 100, 600)
+    assert fetches == [([first.address], 100, 600)]
+    assert store.get_synced_range(first.address) == (100, 600)
+
+
+def test_geyser_ahead_served_from_store(store, fetches):
+    store.add_events(
+        first.address, in_range(onChain[first.address], 100, 700), 100, 700
+    )
+    store.add_events(
+        second.address, in_range(onChain[second.address], 100, 400), 100, 400
+    )
+
+    events = calc_stakes.sync_geyser_events([first], 100, 600)
+    assert events[first.address] == in_range(onChain[first.address], 100, 600)
+    assert fetches == []
+
+    # Only the geyser behind is fetched, from where it's synced to
+    events = calc_stakes.sync_geyser_events([first, second], 100, 600)
+    assert fetches == [([second.address], 401, 600)]
+    for geyser in (first, second):
+        assert events[geyser.address] == in_range(onChain[geyser.address], 100, 600)
+    assert store.get_synced_range(first.address) == (100, 700)
+    assert store.get_synced_range(second.address) == (100, 600)
+
+
+def test_add_events_rejects_gaps_and_overlaps(store):
+    store.add_events(
+        first.address, in_range(onChain[first.address], 100, 500), 100, 500
+    )
+
+    for fromBlock in (400, 500, 502):
+        with pytest.raises(AssertionError):
+            store.add_events(first.address, [], fromBlock, 600)
+    assert store.get_synced_range(first.address) == (100, 500)
+
+    store.add_events(
+        first.address, in_range(onChain[first.address], 501, 600), 501, 600
+    )
+    assert store.get_synced_range(first.address) == (100, 600)
+    assert store.get_events(first.address, 0, 1000) == in_range(
+        onChain[first.address], 100, 600
+    )
@@ -0,0 +1,48 @@
+from assistant.rewards import geyser_checkpoints
+from assistant.rewards.config import rewards_config
+
+
+def stake(block, user, amount):
+    return {
+        "blockNumber": block,
+        "logIndex": 0,
+        "event": "Staked",
+        "user": user,
+        "amount": amount,
+        "total": amount,
+        "timestamp": block * 13,
+    }
+
+
+def test_checkpoint_checked_against_events_on_record(monkeypatch, tmp_path):
+    monkeypatch.setattr(rewards_config, "checkpointDir", str(tmp_path))
+    geyser = "0x" + "11" * 20
+    events = [stake(10, "0xa", 5), stake(20, "0xb", 7), stake(30, "0xa", 1)]
+
+    def events_on_record(fromBlock, toBlock):
+        return [
+            event for event in events if fromBlock <= event["blockNumber"] <= toBlock
+        ]
+
+    first = geyser_checkpoints.save_checkpoint(
+        geyser, 15, {"users": 1}, None, 1, events_on_record(1, 15)
+    )
+    geyser_checkpoints.save_checkpoint(
+        geyser, 25, {"users": 2}, first, 16, events_on_record(16, 25)
+    )
+    loaded = geyser_checkpoints.load_checkpoint(geyser, 40, events_on_record)
+    assert loaded["block"] == 25
+
+    # An event in the second checkpoint's range was reorged out, resume from the first
+    events.remove(events[1])
+    loaded = geyser_checkpoints.load_checkpoint(geyser, 40, events_on_record)
+    assert loaded["block"] == 15
+
+    # The first checkpoint was rebuilt on other events, its old child no longer follows from it
+    events.insert(1, stake(20, "0xb", 7))
+    events.insert(1, stake(12, "0xc", 2))
+    geyser_checkpoints.save_checkpoint(
+        geyser, 15, {"users": 3}, None, 1, events_on_record(1, 15)
+    )
+    loaded = geyser_checkpoints.load_checkpoint(geyser, 40, events_on_record)
+    assert loaded["block"] == 15 and loaded["state"] == {"users": 3}
@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+
+import pytest
+
+from helpers.log_ranges import AdaptiveRangePlanner, is_range_overflow, scan_logs
+
+
+class Overflow(Exception):
+    pass
+
+
+def chain_logs(startBlock, endBlock, logsPerBlock):
+    return [
+        {"blockNumber": block, "logIndex": i}
+        for block in range(startBlock, endBlock + 1)
+        for i in range(logsPerBlock(block))
+    ]
+
+
+def fake_fetch(logs, limit, calls=None):
+    """
+    getLogs over logs, rejecting ranges with more than limit results like a provider does
+    """
+
+    def fetch(fromBlock, toBlock):
+        result = [log for log in logs if fromBlock <= log["blockNumber"] <= toBlock]
+        if len(result) > limit:
+            raise Overflow("query returned more than {} results (-32005)".format(limit))
+        if calls is not None:
+            calls.append((fromBlock, toBlock))
+        return result
+
+    return fetch
+
+
+def test_overflow_errors_recognised():
+    assert is_range_overflow(
+        ValueError({"code": -32005, "message": "query returned more than 10000"})
+    )
+    assert is_range_overflow(Exception("Log response size exceeded"))
+    assert not is_range_overflow(ConnectionError("connection refused"))
+
+
+def test_window_adapts_within_bounds():
+    planner = AdaptiveRangePlanner(targetLogs=100, window=10, minWindow=2, maxWindow=80)
+
+    # Sparse ranges double the window up to maxWindow
+    for expected in (20, 40, 80, 80):
+        planner.record(planner.window, 5)
+        assert planner.window == expected
+
+    # A short range at the end of a scan says nothing about the window
+    planner.record(10, 0)
+    assert planner.window == 80
+
+    # Busy ranges halve it down to minWindow
+    for expected in (40, 20, 10, 5, 2, 2):
+        planner.record(planner.window, 500)
+        assert planner.window == expected
+
+    planner.record_overflow(1)
+    assert planner.window == 2
+    assert planner.next_range(100, 1000) == (100, 101)
+    assert planner.next_range(100, 100) == (100, 100)
+
+
+def test_density_sets_starting_window():
+    assert AdaptiveRangePlanner(density=2, targetLogs=1000).window == 500
+    assert AdaptiveRangePlanner(density=0, maxWindow=5000).window == 5000
+    assert AdaptiveRangePlanner(density=10 ** 6, minWindow=3).window == 3
+    assert AdaptiveRangePlanner(density=None, window=250).window == 250
+
+
+def test_overflow_splits_to_single_blocks():
+    logs = chain_logs(1, 200, lambda block: 3 if block % 7 == 0 else block % 2)
+    calls = []
+    planner = AdaptiveRangePlanner(window=10000)
+
+    # Any range holding a busy block overflows, so those are fetched one block at a time
+    assert scan_logs(fake_fetch(logs, 3, calls), 1, 200, planner) == logs
+    assert all(fromBlock <= toBlock for fromBlock, toBlock in calls)
+    assert (7, 7) in calls
+    assert [block for call in calls for block in range(call[0], call[1] + 1)] == list(
+        range(1, 201)
+    )
+
+
+def test_errors_reraised():
+    logs = chain_logs(1, 100, lambda block: 5 if block == 50 else 0)
+
+    # A single block over the limit can't be split any further
+    with pytest.raises(Overflow):
+        scan_logs(fake_fetch(logs, 3), 1, 100, AdaptiveRangePlanner(window=100))
+
+    def fetch(fromBlock, toBlock):
+        raise ConnectionError("connection refused")
+
+    with pytest.raises(ConnectionError):
+        scan_logs(fetch, 1, 100, AdaptiveRangePlanner(window=100))
+
+
+def test_concurrent_scan_matches_serial_scan():
+    logs = chain_logs(1, 600, lambda block: 4 if block % 45 == 0 else block % 3)
+    serial = scan_logs(fake_fetch(logs, 6), 1, 600, AdaptiveRangePlanner(window=40))
+    assert serial == logs
+
+    # Ranges complete out of order, some after being split on overflow
+    rng = random.Random(5)
+    lock = threading.Lock()
+    fetch = fake_fetch(logs, 6)
+
+    def slow_fetch(fromBlock, toBlock):
+        with lock:
+            delay = rng.random() / 100
+        time.sleep(delay)
+        return fetch(fromBlock, toBlock)
+
+    concurrent = scan_logs(
+        slow_fetch, 1, 600, AdaptiveRangePlanner(window=40), workers=4
+    )
+    assert concurrent == serial
+
+
+def test_concurrent_scan_raises_worker_errors():
+    logs = chain_logs(1, 600, lambda block: 1)
+    fetch = fake_fetch(logs, 1000)
+
+    def failing_fetch(fromBlock, toBlock):
+        if fromBlock <= 300 <= toBlock:
+            raise ConnectionError("connection refused")
+        return fetch(fromBlock, toBlock)
+
+    with pytest.raises(ConnectionError):
+        scan_logs(failing_fetch, 1, 600, AdaptiveRangePlanner(window=20), workers=4)
@@ -0,0 +1,94 @@
+import random
+import secrets
+
+import pytest
+from assistant.rewards.claim_encoder import encode_claim
+from assistant.rewards.config import rewards_config
+from assistant.rewards.merkle_tree import rewards_to_merkle_tree
+from assistant.rewards.RewardsList import RewardsList
+from eth_utils.hexadecimal import encode_hex
+from helpers.merkle import MerkleTree
+
+
+def random_elements(numElements):
+    return ["0x" + secrets.token_hex(100) for i in range(numElements)]
+
+
+@pytest.mark.parametrize("numElements", [1, 2, 3, 7, 8, 100])
+def test_all_proofs_match_single_proofs(numElements):
+    elements = random_elements(numElements)
+    tree = MerkleTree(elements)
+    proofs = tree.get_all_proofs()
+
+    assert len(proofs) == numElements
+    for el in elements:
+        idx = tree.get_position(el)
+        assert proofs[idx] == tree.get_proof_at(idx)
+        assert proofs[idx] == tree.get_proof(el)
+
+
+def test_proofs_verify_against_root():
+    elements = random_elements(33)
+    tree = MerkleTree(elements)
+    for el in elements:
+        assert MerkleTree.verify(tree.get_proof(el), tree.root, el)
+    assert not MerkleTree.verify(
+        tree.get_proof(elements[0]), tree.root, random_elements(1)[0]
+    )
+
+
+@pytest.mark.parametrize("numElements", [5, 17, 1000, 1025])
+@pytest.mark.parametrize("workers", [2, 3, 4])
+def test_parallel_build_matches_serial(numElements, workers):
+    elements = random_elements(numElements)
+    serial = MerkleTree(elements)
+    parallel = MerkleTree.build(elements, workers=workers)
+
+    assert parallel.root == serial.root
+    assert parallel.layers == serial.layers
+
+
+def random_rewards(cycle, users, tokens, seed):
+    rng = random.Random(seed)
+    rewards = RewardsList(cycle, None)
+    for user in users:
+        for token in tokens:
+            rewards.increase_user_rewards(user, token, rng.randint(0, 10 ** 24))
+    return rewards
+
+
+def test_indices_stable_across_cycles(monkeypatch):
+    monkeypatch.setattr(rewards_config, "claimEncoderCheckRate", 0)
+    users = ["0x{:040x}".format(i + 1) for i in range(50)]
+    tokens = ["0x{:040x}".format(i + 1000) for i in range(2)]
+
+    previous = random_rewards(1, users[:40], tokens, seed=1)
+    previousTree = rewards_to_merkle_tree(previous, 0, 1, previous)
+
+    # Some users unchanged, some with new rewards, and some new users, in a different order
+    current = RewardsList(2, None)
+    for user in reversed(users):
+        for token in tokens:
+            amount = previous.getTokenRewards(user, token)
+            if users.index(user) % 3 == 0 or user not in previous.claims:
+                amount += 10 ** 18
+            current.increase_user_rewards(user, token, amount)
+    tree = rewards_to_merkle_tree(current, 1, 2, current, previousTree)
+
+    for user, claim in previousTree["claims"].items():
+        assert tree["claims"][user]["index"] == claim["index"]
+    assert sorted(int(claim["index"], 16) for claim in tree["claims"].values()) == list(
+        range(len(users))
+    )
+
+    for user, claim in tree["claims"].items():
+        assert claim["node"] == encode_hex(
+            encode_claim(
+                claim["tokens"],
+                claim["cumulativeAmounts"],
+                int(claim["index"], 16),
+                2,
+                user,
+            )
+        )
+        assert MerkleTree.verify(claim["proof"], tree["merkleRoot"], claim["node"])
@@ -0,0 +1,66 @@
+import http.client
+import json
+import threading
+
+import pytest
+from assistant.rewards.proof_server import ProofServer
+from assistant.rewards.rewards_file import write_rewards_file
+from tests.rewards_tree.fixtures import sample_distribution
+
+
+def write_sample(fileName, numClaims, cycle):
+    distribution = sample_distribution(numClaims)
+    distribution["cycle"] = cycle
+    write_rewards_file(fileName, distribution, distribution["claims"].items())
+    return distribution
+
+
+def get(port, path):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = json.loads(response.read())
+    connection.close()
+    return (response.status, body)
+
+
+@pytest.fixture
+def server(tmp_path):
+    fileName = str(tmp_path / "rewards-1.json")
+    distribution = write_sample(fileName, 50, 1)
+    server = ProofServer(("127.0.0.1", 0), fileName)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield (server, distribution)
+    server.shutdown()
+    server.server_close()
+
+
+def test_serves_proofs_and_root(server):
+    (server, distribution) = server
+    port = server.server_address[1]
+
+    for user, claim in distribution["claims"].items():
+        assert get(port, "/proof/" + user) == (200, claim)
+    assert get(port, "/proof/0x" + "ff" * 20)[0] == 404
+    assert get(port, "/proof/nonsense")[0] == 404
+
+    (status, root) = get(port, "/root")
+    assert status == 200
+    assert root["merkleRoot"] == distribution["merkleRoot"]
+    assert root["claims"] == 50
+
+    (status, metrics) = get(port, "/metrics")
+    assert metrics["requests"]["proof 200"] == 50
+
+
+def test_reload(server, tmp_path):
+    (server, distribution) = server
+    port = server.server_address[1]
+
+    fileName = str(tmp_path / "rewards-2.json")
+    write_sample(fileName, 80, 2)
+    assert server.reload(fileName)
+    assert not server.reload(fileName)
+
+    (status, root) = get(port, "/root")
+    assert (root["cycle"], root["claims"]) == (2, 80)
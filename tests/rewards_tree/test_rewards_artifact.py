@@ -0,0 +1,81 @@
+import json
+import random
+
+import pytest
+from assistant.rewards.config import rewards_config
+from assistant.rewards.merkle_tree import (
+    build_merkle_distribution,
+    iter_claims_with_proofs,
+)
+from assistant.rewards.rewards_artifact import (
+    decode_rewards_artifact,
+    encode_rewards_artifact,
+    load_rewards_artifact,
+    write_rewards_artifact,
+)
+from assistant.rewards.RewardsList import RewardsList
+from eth_utils import to_checksum_address
+
+
+@pytest.fixture
+def distribution(monkeypatch):
+    monkeypatch.setattr(rewards_config, "claimEncoderCheckRate", 0)
+    rng = random.Random(1)
+    tokens = [
+        to_checksum_address("0x{:040x}".format(rng.getrandbits(160))) for i in range(2)
+    ]
+    rewards = RewardsList(4, None)
+    for i in range(2000):
+        user = to_checksum_address("0x{:040x}".format(rng.getrandbits(160)))
+        for token in tokens[: rng.randint(1, 2)]:
+            rewards.increase_user_rewards(user, token, rng.randint(0, 10 ** 24))
+    return build_merkle_distribution(rewards, 100, 200, rewards)
+
+
+def test_artifact_round_trip(distribution, tmp_path):
+    (distribution, tree) = distribution
+    fileName = str(tmp_path / "rewards.bin.zst")
+    artifactHash = write_rewards_artifact(fileName, distribution, tree)
+
+    withProofs = dict(distribution)
+    withProofs["claims"] = dict(iter_claims_with_proofs(distribution, tree))
+    assert load_rewards_artifact(fileName, True, artifactHash) == withProofs
+
+    loaded = load_rewards_artifact(fileName)
+    assert loaded["claims"] == distribution["claims"]
+    for user, claim in load_rewards_artifact(fileName, verify=False)["claims"].items():
+        assert "proof" not in claim and "node" not in claim
+        assert (
+            claim["cumulativeAmounts"]
+            == distribution["claims"][user]["cumulativeAmounts"]
+        )
+
+    with pytest.raises(ValueError):
+        load_rewards_artifact(fileName, expectedHash="0x" + "00" * 32)
+
+
+def test_artifact_smaller_than_json(distribution):
+    (distribution, tree) = distribution
+    published = dict(distribution)
+    published["claims"] = dict(iter_claims_with_proofs(distribution, tree))
+
+    artifact = encode_rewards_artifact(distribution, tree)
+    assert len(artifact) * 5 < len(json.dumps(published))
+    assert decode_rewards_artifact(artifact)["merkleRoot"] == distribution["merkleRoot"]
+
+
+def test_artifact_claims_checked_against_tree(distribution):
+    (distribution, tree) = distribution
+    tampered = dict(distribution)
+    tampered["claims"] = dict(distribution["claims"])
+    (user, claim) = next(iter(distribution["claims"].items()))
+    tampered["claims"][user] = dict(
+        claim,
+        cumulativeAmounts=[str(int(claim["cumulativeAmounts"][0]) + 1)]
+        + claim["cumulativeAmounts"][1:],
+    )
+
+    artifact = encode_rewards_artifact(tampered, tree)
+    decode_rewards_artifact(artifact, verify=False)
+    with pytest.raises(ValueError):
+        decode_rewards_artifact(artifact)
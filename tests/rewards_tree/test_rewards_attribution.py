@@ -0,0 +1,50 @@
+import random
+
+from assistant.rewards.rewards_assistant import sum_rewards
+from assistant.rewards.rewards_attribution import (
+    lookup_attribution,
+    write_attribution_file,
+)
+from eth_utils import to_checksum_address
+
+
+def geyser_rewards(rng, users, tokens):
+    claims = {}
+    metadata = {}
+    for user in rng.sample(users, len(users) // 2):
+        claims[user] = {token: rng.randint(1, 10 ** 24) for token in tokens}
+        metadata[user] = {
+            "shareSeconds": rng.randint(1, 10 ** 12),
+            "shareSecondsInRange": rng.randint(1, 10 ** 12),
+        }
+    return {"claims": claims, "metadata": metadata}
+
+
+def test_attribution_explains_new_rewards(tmp_path):
+    rng = random.Random(3)
+    users = [to_checksum_address("0x{:040x}".format(i * 7919)) for i in range(1, 200)]
+    tokens = [to_checksum_address("0x{:040x}".format(i + 1000)) for i in range(2)]
+    sources = {key: geyser_rewards(rng, users, tokens) for key in ("native", "sett")}
+    rewards = sum_rewards(sources, 5, None)
+
+    merkleTree = {"merkleRoot": "0x00", "cycle": 5, "startBlock": 1, "endBlock": 2}
+    fileName = str(tmp_path / "rewards.attribution.json")
+    write_attribution_file(fileName, merkleTree, rewards)
+
+    for user in users:
+        attribution = lookup_attribution(fileName, user)
+        if user not in rewards.claims:
+            assert attribution is None
+            continue
+
+        sourceKeys = [key for key in sources if user in sources[key]["claims"]]
+        assert sorted(attribution["sources"]) == sorted(sourceKeys)
+        for token in tokens:
+            assert rewards.getTokenRewards(user, token) == sum(
+                int(attribution["sources"][key]["tokens"][token]) for key in sourceKeys
+            )
+        for key in sourceKeys:
+            assert (
+                attribution["sources"][key]["shareSeconds"]
+                == sources[key]["metadata"][user]["shareSeconds"]
+            )
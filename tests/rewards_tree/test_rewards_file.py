@@ -0,0 +1,38 @@
+import json
+
+from assistant.rewards import rewards_file
+from assistant.rewards.rewards_file import (
+    iter_claims,
+    load_rewards_file,
+    write_rewards_file,
+)
+from tests.rewards_tree.fixtures import sample_distribution
+
+
+def test_streamed_write_matches_json_dump(tmp_path):
+    distribution = sample_distribution(100)
+    fileName = str(tmp_path / "rewards.json")
+    write_rewards_file(fileName, distribution, distribution["claims"].items())
+
+    with open(fileName) as f:
+        assert f.read() == json.dumps(distribution)
+
+
+def test_streamed_read(tmp_path, monkeypatch):
+    # Small chunks split values across buffer refills
+    monkeypatch.setattr(rewards_file, "chunkSize", 7)
+    distribution = sample_distribution(100)
+    fileName = str(tmp_path / "rewards.json")
+    with open(fileName, "w") as f:
+        json.dump(distribution, f)
+
+    assert dict(iter_claims(fileName)) == distribution["claims"]
+    assert load_rewards_file(fileName, withProofs=True) == distribution
+
+    withoutProofs = load_rewards_file(fileName)
+    for user, claim in withoutProofs["claims"].items():
+        assert "proof" not in claim
+        assert (
+            claim["cumulativeAmounts"]
+            == distribution["claims"][user]["cumulativeAmounts"]
+        )
@@ -0,0 +1,141 @@
+import json
+import random
+
+from assistant.rewards.claim_index import ClaimIndex, IndexedClaims
+from assistant.rewards.rewards_ledger import (
+    LedgerClaims,
+    RewardsLedger,
+    extend_indices,
+    merge_cumulative,
+)
+from assistant.rewards.RewardsList import RewardsList
+from eth_utils import to_checksum_address
+
+
+def random_claims(rng, users, tokens, numEntries):
+    claims = {}
+    for i in range(numEntries):
+        userClaims = claims.setdefault(rng.choice(users), {})
+        token = rng.choice(tokens)
+        userClaims[token] = userClaims.get(token, 0) + rng.choice(
+            [0, rng.randint(1, 10 ** 24)]
+        )
+    return claims
+
+
+def add_to_reference(reference, claims):
+    for user, userClaims in claims.items():
+        for token, amount in userClaims.items():
+            referenceClaims = reference.setdefault(user, {})
+            referenceClaims[token] = referenceClaims.get(token, 0) + amount
+
+
+def test_ledger_merge_matches_dict_sums():
+    rng = random.Random(1)
+    users = ["0x{:040x}".format(i) for i in range(200)]
+    tokens = ["0x{:040x}".format(i + 1000) for i in range(3)]
+
+    reference = {}
+    ledger = RewardsLedger()
+    for i in range(4):
+        claims = random_claims(rng, users, tokens, 300)
+        add_to_reference(reference, claims)
+        source = RewardsLedger()
+        source.add_claims(claims)
+        ledger.add(source)
+
+    assert set(ledger.users) == set(reference)
+    for user, tokensOfUser, amounts in ledger.iter_users():
+        # Explicit zero amounts are kept as entries
+        assert dict(zip(tokensOfUser, amounts)) == reference[user]
+    for token in tokens:
+        assert ledger.token_totals()[token] == sum(
+            userClaims.get(token, 0) for userClaims in reference.values()
+        )
+
+
+def test_rewards_list_joins_previous_tree():
+    rng = random.Random(2)
+    users = ["0x{:040x}".format(i) for i in range(50)]
+    tokens = ["0x{:040x}".format(i + 1000) for i in range(2)]
+
+    previousClaims = random_claims(rng, users[:40], tokens, 100)
+    previousTree = {
+        "claims": {
+            user: {
+                "tokens": list(userClaims),
+                "cumulativeAmounts": [str(amount) for amount in userClaims.values()],
+            }
+            for user, userClaims in previousClaims.items()
+        }
+    }
+    newClaims = random_claims(rng, users, tokens, 100)
+
+    new = RewardsList(2, None)
+    new.add_claims(newClaims)
+    result = RewardsList(2, None)
+    result.ledger.add_tree_claims(previousTree["claims"])
+    result.add_rewards(new)
+
+    reference = {}
+    add_to_reference(reference, previousClaims)
+    add_to_reference(reference, newClaims)
+    assert {user: result.claims[user] for user in result.claims} == reference
+    for user in users:
+        for token in tokens:
+            assert result.getTokenRewards(user, token) == reference.get(user, {}).get(
+                token, 0
+            )
+
+
+def test_merge_cumulative_streams_indexed_claims(tmp_path):
+    rng = random.Random(3)
+    users = [
+        to_checksum_address("0x{:040x}".format(rng.getrandbits(160)))
+        for i in range(300)
+    ]
+    tokens = [to_checksum_address("0x{:040x}".format(i + 1000)) for i in range(2)]
+
+    previousClaims = random_claims(rng, users[:200], tokens, 400)
+    claims = {
+        user: {
+            "index": hex(index),
+            "user": user,
+            "tokens": list(userClaims),
+            "cumulativeAmounts": [str(amount) for amount in userClaims.values()],
+        }
+        for index, (user, userClaims) in enumerate(previousClaims.items())
+    }
+    fileName = str(tmp_path / "rewards.json")
+    with open(fileName, "w") as f:
+        json.dump({"merkleRoot": "0x", "claims": claims, "metadata": {}}, f)
+
+    new = RewardsLedger()
+    newClaims = random_claims(rng, users, tokens, 400)
+    new.add_claims(newClaims)
+
+    with ClaimIndex(fileName) as claimIndex:
+        (merged, previousIndices, previousAmounts) = merge_cumulative(
+            IndexedClaims(claimIndex).items(), new, tokens
+        )
+
+    reference = {}
+    add_to_reference(reference, previousClaims)
+    add_to_reference(reference, newClaims)
+    assert merged.users == sorted(reference, key=str.lower)
+    assert dict(LedgerClaims(merged)) == reference
+    assert merged.token_totals() == {
+        token: sum(userClaims.get(token, 0) for userClaims in reference.values())
+        for token in tokens
+    }
+
+    # The merge records what the rest of the cycle needs from the previous tree
+    assert previousIndices == {
+        user: int(claim["index"], 16) for user, claim in claims.items()
+    }
+    assert previousAmounts == {
+        user: int(claim["cumulativeAmounts"][0]) for user, claim in claims.items()
+    }
+    indices = extend_indices(merged.users, previousIndices)
+    assert sorted(indices.values()) == list(range(len(merged.users)))
+    assert all(indices[user] == index for user, index in previousIndices.items())
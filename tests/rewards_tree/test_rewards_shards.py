@@ -0,0 +1,61 @@
+import json
+import os
+import random
+
+import pytest
+from assistant.rewards.config import rewards_config
+from assistant.rewards.merkle_tree import build_merkle_distribution
+from assistant.rewards.rewards_shards import (
+    load_manifest,
+    load_shard_claim,
+    write_rewards_shards,
+)
+from assistant.rewards.RewardsList import RewardsList
+from eth_utils import to_checksum_address
+
+
+@pytest.fixture
+def shards(monkeypatch, tmp_path):
+    monkeypatch.setattr(rewards_config, "claimEncoderCheckRate", 0)
+    rng = random.Random(2)
+    token = to_checksum_address("0x{:040x}".format(rng.getrandbits(160)))
+    rewards = RewardsList(7, None)
+    for i in range(500):
+        user = to_checksum_address("0x{:040x}".format(rng.getrandbits(160)))
+        rewards.increase_user_rewards(user, token, rng.randint(1, 10 ** 24))
+    (distribution, tree) = build_merkle_distribution(rewards, 100, 200, rewards)
+
+    directory = str(tmp_path / "shards")
+    write_rewards_shards(directory, distribution, tree)
+    return (directory, distribution)
+
+
+def test_shard_claims_verify(shards):
+    (directory, distribution) = shards
+    manifest = load_manifest(directory)
+    assert manifest["merkleRoot"] == distribution["merkleRoot"]
+    assert sum(shard["claims"] for shard in manifest["shards"].values()) == len(
+        distribution["claims"]
+    )
+
+    for user, claim in distribution["claims"].items():
+        shardClaim = load_shard_claim(directory, user, manifest)
+        assert shardClaim["cumulativeAmounts"] == claim["cumulativeAmounts"]
+        assert shardClaim["node"] == claim["node"]
+
+    assert load_shard_claim(directory, "0x" + "00" * 20, manifest) is None
+
+
+def test_tampered_shard_rejected(shards):
+    (directory, distribution) = shards
+    user = next(iter(distribution["claims"]))
+    manifest = load_manifest(directory)
+    fileName = os.path.join(directory, manifest["shards"][user[2:4].lower()]["file"])
+    with open(fileName) as f:
+        shard = json.load(f)
+    shard["claims"][user]["cumulativeAmounts"] = ["1"]
+    with open(fileName, "w") as f:
+        json.dump(shard, f)
+
+    with pytest.raises(ValueError):
+        load_shard_claim(directory, user, manifest)
@@ -0,0 +1,112 @@
+import random
+
+from assistant.rewards.BadgerGeyserMock import BadgerGeyserMock
+from assistant.rewards.calc_stakes import events_to_actions, process_actions
+from assistant.rewards.columnar_share_seconds import columnar_share_seconds
+
+
+class StakeLoopGeyserMock(BadgerGeyserMock):
+    """
+    Share seconds accumulated by iterating over every open stake, as before the running totals
+    """
+
+    def process_share_seconds(self, user, timestamp):
+        data = self.users.get(user)
+        if not data or data.total is None:
+            return 0
+
+        lastUpdate = self.getLastUpdate(user)
+        lastUpdateRangeGated = max(self.startTime, int(lastUpdate))
+        timeSinceLastAction = int(timestamp) - int(lastUpdate)
+        timeSinceLastActionRangeGated = int(timestamp) - int(lastUpdateRangeGated)
+        if timeSinceLastAction == 0:
+            return 0
+
+        toAdd = 0
+        toAddInRange = 0
+        for stake in data.stakes:
+            toAdd += stake.amount * self.calculate_weighted_seconds(
+                stake, timeSinceLastAction, timestamp
+            )
+            if timestamp > self.startTime:
+                toAddInRange += stake.amount * self.calculate_weighted_seconds(
+                    stake, timeSinceLastActionRangeGated, timestamp
+                )
+
+        data.shareSeconds += toAdd
+        data.shareSecondsInRange += toAddInRange
+        self.totalShareSeconds += toAdd
+        self.totalShareSecondsInRange += toAddInRange
+
+
+def synthetic_events(numUsers, numBlocks, seed=1):
+    """
+    Random stakes and unstakes, with many open stakes per user
+    """
+    rng = random.Random(seed)
+    users = ["0x{:040x}".format(i + 1) for i in range(numUsers)]
+    balances = {user: 0 for user in users}
+    events = []
+    for block in range(numBlocks):
+        for logIndex in range(rng.randint(0, 3)):
+            user = rng.choice(users)
+            if balances[user] > 0 and rng.random() < 0.3:
+                amount = rng.randint(1, balances[user])
+                balances[user] -= amount
+                event = "Unstaked"
+            else:
+                amount = rng.randint(1, 10 ** 24)
+                balances[user] += amount
+                event = "Staked"
+            events.append(
+                {
+                    "blockNumber": block,
+                    "logIndex": logIndex,
+                    "event": event,
+                    "user": user,
+                    "amount": amount,
+                    "total": balances[user],
+                    "timestamp": 1600000000 + block * 13,
+                }
+            )
+    return events
+
+
+def run_mock(mockClass, events, startTime, endTime):
+    geyserMock = mockClass("test")
+    geyserMock.set_current_period(startTime, endTime)
+    return process_actions(geyserMock, events_to_actions(events), 0, endTime)
+
+
+def test_share_seconds_parity():
+    events = synthetic_events(numUsers=20, numBlocks=2000)
+    startTime = 1600000000 + 1500 * 13
+    endTime = 1600000000 + 2000 * 13
+
+    expected = run_mock(StakeLoopGeyserMock, events, startTime, endTime)
+    actual = run_mock(BadgerGeyserMock, events, startTime, endTime)
+
+    assert list(actual.users.keys()) == list(expected.users.keys())
+    for user, data in expected.users.items():
+        assert actual.users[user].shareSeconds == data.shareSeconds
+        assert actual.users[user].shareSecondsInRange == data.shareSecondsInRange
+    assert actual.totalShareSeconds == expected.totalShareSeconds
+    assert actual.totalShareSecondsInRange == expected.totalShareSecondsInRange
+
+
+def test_columnar_share_seconds_parity():
+    events = synthetic_events(numUsers=20, numBlocks=2000, seed=2)
+    startTime = 1600000000 + 1500 * 13
+    endTime = 1600000000 + 2000 * 13
+
+    expected = run_mock(BadgerGeyserMock, events, startTime, endTime)
+    (users, shareSeconds, shareSecondsInRange) = columnar_share_seconds(
+        events, startTime, endTime
+    )
+
+    assert users == list(expected.users.keys())
+    for user, userShareSeconds, userShareSecondsInRange in zip(
+        users, shareSeconds, shareSecondsInRange
+    ):
+        assert userShareSeconds == expected.users[user].shareSeconds
+        assert userShareSecondsInRange == expected.users[user].shareSecondsInRange
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import pickle
+import time
+from types import SimpleNamespace
+
+from assistant.rewards import rewards_assistant, stage_cache
+from assistant.rewards.stage_cache import StageCache, stage_key
+
+
+def test_entries_round_trip_and_fail_integrity_check(tmp_path):
+    cache = StageCache(str(tmp_path), 3600, 1 << 20)
+    key = stage_key("geyser", {"geyser": "0x01", "startBlock": 1, "endBlock": 2})
+    assert cache.load("geyser", key) is None
+
+    value = {"claims": {"0x02": {"0x03": 10 ** 30}}, "metadata": {}}
+    calls = []
+    assert cache.get("geyser", key, lambda: calls.append(1) or value) == value
+    assert cache.get("geyser", key, lambda: calls.append(1) or value) == value
+    assert calls == [1]
+
+    fileName = cache.file_name("geyser", key)
+    with open(fileName, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 1]))
+    assert cache.load("geyser", key) is None
+    assert not os.path.exists(fileName)
+
+    # An entry under another key's name is rejected too
+    otherKey = stage_key("geyser", {"geyser": "0x04"})
+    cache.save("geyser", otherKey, value)
+    os.replace(cache.file_name("geyser", otherKey), fileName)
+    assert cache.load("geyser", key) is None
+
+
+def test_unreadable_entries_removed_and_keys_versioned(monkeypatch, tmp_path):
+    cache = StageCache(str(tmp_path), 3600, 1 << 20)
+    key = stage_key("geyser", {"geyser": "0x01"})
+
+    # A pickle of a class that no longer exists passes the hash but can't be loaded
+    payload = pickle.dumps(("geyser", key, SimpleNamespace()))
+    payload = payload.replace(b"types", b"gone_")
+    fileName = cache.file_name("geyser", key)
+    os.makedirs(os.path.dirname(fileName))
+    with open(fileName, "wb") as f:
+        f.write(stage_cache.magic + hashlib.sha256(payload).digest() + payload)
+    assert cache.load("geyser", key) is None
+    assert not os.path.exists(fileName)
+
+    monkeypatch.setattr(stage_cache, "STAGE_CACHE_VERSION", 2)
+    assert stage_key("geyser", {"geyser": "0x01"}) != key
+
+
+def test_eviction_by_age_then_size(tmp_path):
+    cache = StageCache(str(tmp_path), 3600, 1 << 20)
+    now = time.time()
+    keys = [stage_key("merkle", i) for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.save("merkle", key, b"x" * 1000)
+        os.utime(cache.file_name("merkle", key), (now - i * 1000, now - i * 1000))
+
+    # keys[3] is past maxAge, then keys[2] is the oldest of what's left over the size limit
+    os.utime(cache.file_name("merkle", keys[3]), (now - 7200, now - 7200))
+    cache.maxBytes = 2500
+    cache.evict(now)
+    remaining = [key for key in keys if os.path.exists(cache.file_name("merkle", key))]
+    assert remaining == keys[:2]
+
+
+def test_geyser_entries_keyed_by_block_hash_and_saved_once_confirmed(
+    monkeypatch, tmp_path
+):
+    cache = StageCache(str(tmp_path), 3600, 1 << 20)
+    badger = SimpleNamespace(
+        badgerTree=None, geysers={"native": SimpleNamespace(address="0x01")}
+    )
+    hashes = {10: "0xaa", 20: "0xbb"}
+    calls = []
+
+    def compute_geysers(geysers, startBlock, endBlock):
+        calls.append(endBlock)
+        return {key: {"claims": {}, "metadata": {}} for key in geysers}
+
+    monkeypatch.setattr(rewards_assistant, "compute_geysers", compute_geysers)
+    monkeypatch.setattr(rewards_assistant, "get_unlock_schedules", lambda geyser: [])
+    monkeypatch.setattr(
+        rewards_assistant,
+        "get_block_cache",
+        lambda: SimpleNamespace(
+            get_blocks=lambda blocks: {
+                block: {"number": block, "hash": hashes[block]} for block in blocks
+            }
+        ),
+    )
+
+    # Within eventStoreConfirmations of the head, the result isn't saved
+    monkeypatch.setattr(rewards_assistant, "chain", SimpleNamespace(height=25))
+    rewards_assistant.calc_geyser_rewards(badger, 10, 20, 1, cache)
+    rewards_assistant.calc_geyser_rewards(badger, 10, 20, 1, cache)
+    assert calls == [20, 20]
+
+    monkeypatch.setattr(rewards_assistant, "chain", SimpleNamespace(height=1000))
+    first = rewards_assistant.calc_geyser_rewards(badger, 10, 20, 1, cache)
+    second = rewards_assistant.calc_geyser_rewards(badger, 10, 20, 1, cache)
+    assert second.inputsHash == first.inputsHash
+    assert calls == [20, 20, 20]
+
+    # The same range on another chain of blocks is a different entry
+    hashes[20] = "0xcc"
+    reorged = rewards_assistant.calc_geyser_rewards(badger, 10, 20, 1, cache)
+    assert calls == [20, 20, 20, 20]
+    assert reorged.inputsHash != first.inputsHash